@@ -1,84 +1,200 @@
-from copy import deepcopy
+from copy import copy
+import instrumentation
+from metrics import MetricsSink
+from helper_scripts import TaskTable, as_task_table
+from ready_queue import ReadyQueue
 
-def IDRR(dataset: list):
+class IDRRState:
     """
-    Implementation of the IDRR algorithm as described in the report.
+    Everything the IDRR algorithm carries from one CPU allocation to the next. Keeping it in one object
+    makes it possible to checkpoint a run right before a task is admitted and finish the copy on its own.
+    The tasks are rows of a TaskTable, and the per task attributes are copied to lists for the run.
     """
-    task_dataset = deepcopy(dataset)
-    REQUEST_QUEUE = list()
-    DONE_LIST = list()
+    def __init__(self, table, sink=None):
+        self.table = table
+        self.arrival_time = table.arrival_time.tolist()
+        self.remaining_burst_time = table.remaining_burst_time.tolist()
+        self.response_time = table.response_time.tolist()
+        self.allocated = table.allocated.tolist()
+        self.ids = table.id; self.burst_time = table.burst_time
+        self.source = None  # A TraceSource the tasks are pulled from, in place of the table
+        self.next_task = 0; self.last_task = len(table)  # Rows [next_task, last_task) are still to be admitted
+        self.REQUEST_QUEUE = ReadyQueue(self.remaining_burst_time, self.arrival_time)
+        self.DONE_LIST = list(); self.FINISH_TIMES = list()
+        self.sink = sink; self.keep_done = sink is None or sink.keep_tasks  # Update a MetricsSink as the tasks finish?
+        self.QT = 0; self.TIME = 0; self.CS = 0; self.number_of_QT_calculations = 0; self.FIRST_QT = True
+        self.tasks_in_round = 0; self.sorted_elements = 0
+        self.stats = instrumentation.ACTIVE  # Reported to once per round if not None
 
-    # Adding the first arrived task with arrival time 0 (from the back!)
-    while len(task_dataset) != 0 and task_dataset[-1].get_arrival_time() == 0:
-        REQUEST_QUEUE.append(task_dataset.pop())
+    def fork(self):
+        """
+        Returns a copy of the state with nothing left to admit. The done tasks are shared since they never change again.
+        """
+        state = copy(self)
+        state.last_task = self.next_task
+        state.remaining_burst_time = self.remaining_burst_time[:]
+        state.response_time = self.response_time[:]
+        state.allocated = self.allocated[:]
+        state.REQUEST_QUEUE = self.REQUEST_QUEUE.copy(state.remaining_burst_time, state.arrival_time)
+        state.DONE_LIST = self.DONE_LIST[:]; state.FINISH_TIMES = self.FINISH_TIMES[:]
+        state.sink = self.sink.copy() if self.sink is not None else None
+        return state
 
-    QT = 0; TIME = 0; CS = 0; number_of_QT_calculations = 0; FIRST_QT = True; NEW_ROUND = False
-    # Calculate the first QT
-    number_of_QT_calculations += 1
+class IDRRStreamState(IDRRState):
+    """
+    The state of an IDRR run on the tasks of a TraceSource. The tasks are pulled from the source as TIME reaches their
+    arrival time, and their attributes are kept in dicts (by row) only until they finish, so the memory used is bounded
+    by the queue rather than by the length of the trace.
+    """
+    def __init__(self, source, sink):
+        super().__init__(TaskTable([], [], []), sink)
+        self.source = source
+        self.ids = dict(); self.arrival_time = dict(); self.burst_time = dict()
+        self.remaining_burst_time = dict(); self.response_time = dict(); self.allocated = dict()
+        self.REQUEST_QUEUE = ReadyQueue(self.remaining_burst_time, self.arrival_time)
+
+def IDRR(dataset, sink=None):
+    """
+    Implementation of the IDRR algorithm as described in the report. The dataset is a TaskTable
+    (or a list of Tasks), and the done tasks are returned as a TaskTable in the order they finished.
+    A metrics.MetricsSink given as 'sink' is updated as every task finishes, and if it doesn't keep the tasks
+    it is returned in place of the done tasks, which are then never stored.
+    """
+    return _run(IDRRState(as_task_table(dataset), sink))
+
+def IDRR_prefixes(dataset, prefix_lengths: list, sink=None) -> list:
+    """
+    Returns the same as IDRR(dataset[:x]) for every x in prefix_lengths, i.e. the algorithm applied
+    on the x first arrived tasks, but the tasks up to the largest prefix are only admitted once.
+    Right before task x+1 is admitted the run is forked, and the fork is finished without any more tasks,
+    so every fork still serves its own queue until it drains. The run stops at the largest prefix.
+    Every fork gets its own copy of the sink.
+    """
+    forks = sorted(set(prefix_lengths), reverse=True)  # Smallest prefix in the back
+    results = dict()
+    state = IDRRState(as_task_table(dataset), sink)
+    if forks:  # No task after the largest prefix is ever admitted
+        state.last_task = min(state.last_task, forks[0])
+    final_results = _run(state, forks, results)
+
+    # The largest prefix (and any longer one) ends the same way as the main run
+    for x in forks:
+        results[x] = final_results
+    return [results[x] for x in prefix_lengths]
+
+def IDRR_stream(source, sink=None) -> tuple:
+    """
+    Applies the IDRR algorithm on the tasks of a trace_source.TraceSource, pulling them from it as they arrive.
+    The done tasks are never stored, so the metrics are collected in 'sink' (a new metrics.MetricsSink if None)
+    and (sink, CS, NOQTC) is returned.
+    """
+    sink = MetricsSink() if sink is None else sink
+    if sink.keep_tasks:
+        raise ValueError('The done tasks of a streamed run are not kept, use a MetricsSink with keep_tasks=False')
+    return _run(IDRRStreamState(source, sink))
+
+def _run(state: IDRRState, forks=None, results=None):
+    while _step(state, forks, results):
+        pass
+
+    state.CS -= 1  # It never switches from the last task...
+    if not state.keep_done:
+        return state.sink, state.CS, state.number_of_QT_calculations
+    DONE_LIST = state.table.finished(state.DONE_LIST, [state.response_time[task] for task in state.DONE_LIST], state.FINISH_TIMES)
+    return DONE_LIST, state.CS, state.number_of_QT_calculations
+
+def _step(state: IDRRState, forks=None, results=None) -> bool:
+    """
+    Admits the arrived tasks and serves one round, or jumps an idle gap. Returns False once there is nothing left to do.
+    """
+    _admit(state, forks, results)
+    if not _new_round(state):
+        # The queue drained before the next arrival, jump the idle gap straight to it
+        next_arrival_time = _next_arrival_time(state)
+        if next_arrival_time == float('inf'):
+            return False
+        state.TIME = next_arrival_time
+        return True
+    _round(state)
+    return True
+
+def _next_arrival_time(state: IDRRState) -> float:
+    # The tasks are admitted in arrival order, so the next arrival is the next task to admit (infinity if there is none)
+    if state.source is not None:
+        return state.source.next_arrival_time()
+    return state.arrival_time[state.next_task] if state.next_task < state.last_task else float('inf')
+
+def _admit(state: IDRRState, forks: list, results: dict) -> None:
+    # Insert all the "arrived" tasks in the REQUEST_QUEUE
+    if state.source is not None:
+        for task in state.source.pull(state):
+            state.REQUEST_QUEUE.admit(task)
+        return
+    while state.next_task < state.last_task and state.arrival_time[state.next_task] <= state.TIME:
+        # Checkpoint the prefixes ending right before this task
+        while forks and forks[-1] == state.next_task:
+            results[forks.pop()] = _run(state.fork())
+        state.REQUEST_QUEUE.admit(state.next_task); state.next_task += 1
+
+def _new_round(state: IDRRState) -> bool:
+    REQUEST_QUEUE = state.REQUEST_QUEUE
+    state.tasks_in_round = len(REQUEST_QUEUE)
+    if len(REQUEST_QUEUE) == 0:
+        return False
+    state.sorted_elements = len(REQUEST_QUEUE) if REQUEST_QUEUE.admitted else 0  # Merged in
+    REQUEST_QUEUE.start_round()
+
+    # Calculate the quantum time
     if len(REQUEST_QUEUE) == 1:
-        QT = REQUEST_QUEUE[0].get_burst_time()
+        state.QT = REQUEST_QUEUE.max_remaining_burst_time()
     else:
         # The next step is the only reasonable to implement, but still unsure what the paper means
-        REQUEST_QUEUE.sort(key=lambda TASK: TASK.get_remaining_burst_time(), reverse=True)
-        QT = round(REQUEST_QUEUE[0].get_remaining_burst_time() + REQUEST_QUEUE[1].get_remaining_burst_time())/2
+        if state.number_of_QT_calculations == 0:  # The first QT
+            state.QT = round(REQUEST_QUEUE.max_remaining_burst_time() + REQUEST_QUEUE.max_remaining_burst_time(2))/2
+        elif state.FIRST_QT:
+            [first_arrival_time, second_arrival_time] = REQUEST_QUEUE.smallest_arrival_times()
+            state.QT = round(REQUEST_QUEUE.max_remaining_burst_time() + state.QT)/2 - round(first_arrival_time + second_arrival_time)/2
+            state.FIRST_QT = False
+        else:
+            [first_arrival_time, _] = REQUEST_QUEUE.smallest_arrival_times()
+            state.QT = round(REQUEST_QUEUE.max_remaining_burst_time() + state.QT)/2 - round(first_arrival_time/2)
+    state.number_of_QT_calculations += 1
 
-    task_counter = 0; tasks_in_round = len(REQUEST_QUEUE)
-    while len(REQUEST_QUEUE) > 0:
-        current_task = REQUEST_QUEUE[-1]
+    # Edge case, but can happen even with a reasonable dataset. A single first task is never checked,
+    # the QT is recalculated right after its allocation anyway
+    if state.QT <= 0 and (state.number_of_QT_calculations > 1 or len(REQUEST_QUEUE) > 1):
+        raise ValueError(f'[IDRR] QT calculated to: {state.QT}')
+    return True
+
+def _round(state: IDRRState) -> None:
+    REQUEST_QUEUE = state.REQUEST_QUEUE; QT = state.QT; TIME = state.TIME
+    remaining_burst_time = state.remaining_burst_time; allocated = state.allocated
+    for _ in range(state.tasks_in_round):
+        current_task = REQUEST_QUEUE.head()
 
         # CPU allocation
-        # print('[CPU] Allocating task: ', current_task.get_id(), 'QT: ', QT, 'TIME: ', TIME)
-        TIME += current_task.allocate_to_CPU(TIME, QT); CS += 1; task_counter += 1
-        if current_task.get_remaining_burst_time() == 0:  # Finished?
-            current_task.is_finished(TIME)
-            DONE_LIST.append(current_task)
+        # print('[CPU] Allocating task: ', current_task, 'QT: ', QT, 'TIME: ', TIME)
+        if not allocated[current_task]:
+            state.response_time[current_task] = TIME - state.arrival_time[current_task]
+            allocated[current_task] = True
+        state.CS += 1
+        if QT >= remaining_burst_time[current_task]:  # Finished?
+            TIME += remaining_burst_time[current_task]; remaining_burst_time[current_task] = 0
+            _finish(state, current_task, TIME)
             REQUEST_QUEUE.pop()
 
-        # Move task to the back of the request queue 
+        # Move task to the back of the request queue
         else:
-            REQUEST_QUEUE.insert(0, current_task)
-            REQUEST_QUEUE.pop()
+            TIME += QT; remaining_burst_time[current_task] -= QT
+            REQUEST_QUEUE.rotate()
+    state.TIME = TIME
+    if state.stats is not None:
+        state.stats.record_round('IDRR', state.tasks_in_round, len(REQUEST_QUEUE), state.sorted_elements, state.tasks_in_round, TIME, QT)
 
-        # Is this a new round?
-        if (len(REQUEST_QUEUE) == 0 and len(task_dataset) != 0):
-            NEW_ROUND = True
-            task_counter = 0
-        elif task_counter == tasks_in_round:
-            NEW_ROUND = True
-            task_counter = 0
-        else:
-            NEW_ROUND = False
-        
-        if NEW_ROUND:
-            # Insert all the "arrived" tasks in the ARRIVE_QUEUE
-            while len(task_dataset) > 0:
-                if task_dataset[-1].get_arrival_time() <= TIME:
-                    REQUEST_QUEUE.append(task_dataset.pop())
-                else:
-                    break
-            
-            tasks_in_round = len(REQUEST_QUEUE)
-
-            # Calculate the quantum time
-            if len(REQUEST_QUEUE) == 0:
-                break 
-            elif len(REQUEST_QUEUE) == 1:
-                number_of_QT_calculations += 1
-                QT = REQUEST_QUEUE[0].get_remaining_burst_time()
-            else:
-                REQUEST_QUEUE.sort(key=lambda TASK: TASK.get_remaining_burst_time(), reverse=True)
-                number_of_QT_calculations += 1
-                if FIRST_QT:
-                    TEMP = sorted(REQUEST_QUEUE, key=lambda TASK: TASK.get_arrival_time())
-                    QT = round(REQUEST_QUEUE[0].get_remaining_burst_time() + QT)/2 - round(TEMP[0].get_arrival_time() + TEMP[1].get_arrival_time())/2
-                    FIRST_QT = False
-                else:
-                    TEMP = sorted(REQUEST_QUEUE, key=lambda TASK: TASK.get_arrival_time())
-                    QT = round(REQUEST_QUEUE[0].get_remaining_burst_time() + QT)/2 - round(TEMP[0].get_arrival_time()/2)
-        
-        # Edge case, but can happen even with a reasonable dataset 
-        if QT <= 0:
-            raise ValueError(f'[IDRR] QT calculated to: {QT}')
-        
-    CS -= 1  # It never switches from the last task...
-    return DONE_LIST, CS, number_of_QT_calculations
+def _finish(state: IDRRState, task: int, TIME) -> None:
+    if state.keep_done:
+        state.DONE_LIST.append(task); state.FINISH_TIMES.append(TIME)
+    if state.sink is not None:
+        state.sink.add(state.arrival_time[task], int(state.burst_time[task]), state.response_time[task], TIME)
+    if state.source is not None:
+        state.source.finish(state, task, TIME)
@@ -1,67 +1,194 @@
-from copy import deepcopy
-import numpy as np
+from copy import copy
+import instrumentation
+from metrics import MetricsSink
+from helper_scripts import TaskTable, as_task_table
+from ready_queue import ReadyQueue
 
-def NIRR(dataset: list):
+class NIRRState:
     """
-    Implementation of the NIRR algorithm as described in the report.
+    Everything the NIRR algorithm carries from one round to the next. Keeping it in one object
+    makes it possible to checkpoint a run right before a task is admitted and finish the copy on its own.
+    The tasks are rows of a TaskTable, and the per task attributes are copied to lists for the run.
     """
-    task_dataset = deepcopy(dataset)
-    ARRIVE_QUEUE = list()
-    REQUEST_QUEUE = list()
-    DONE_LIST = list()
-
-    # Adding the first arrived task with arrival time 0 (from the back!)
-    while len(task_dataset) != 0 and task_dataset[-1].get_arrival_time() == 0:
-        ARRIVE_QUEUE.append(task_dataset.pop())
-
-    QT = 0; TIME = 0; CS = 0; number_of_QT_calculations = 0
-    while len(ARRIVE_QUEUE) > 0:
-
-        # Move all the current tasks in the arrive queue to the REQUEST
-        REQUEST_QUEUE.extend(ARRIVE_QUEUE[:])
-        ARRIVE_QUEUE.clear()
-
-        # Calculate the quantum time 
-        number_of_QT_calculations += 1
-        if len(REQUEST_QUEUE) == 1 & REQUEST_QUEUE[0].get_id() == 1:
-                QT = REQUEST_QUEUE[0].get_burst_time()
+    def __init__(self, table, sink=None):
+        self.table = table
+        self.arrival_time = table.arrival_time.tolist()
+        self.remaining_burst_time = table.remaining_burst_time.tolist()
+        self.response_time = table.response_time.tolist()
+        self.allocated = table.allocated.tolist()
+        self.ids = table.id; self.burst_time = table.burst_time
+        self.source = None  # A TraceSource the tasks are pulled from, in place of the table
+        self.next_task = 0; self.last_task = len(table)  # Rows [next_task, last_task) are still to be admitted
+        self.ARRIVE_QUEUE = ReadyQueue(self.remaining_burst_time)
+        self.DONE_LIST = list(); self.FINISH_TIMES = list()
+        self.sink = sink; self.keep_done = sink is None or sink.keep_tasks  # Update a MetricsSink as the tasks finish?
+        self.QT = 0; self.TIME = 0; self.CS = 0; self.number_of_QT_calculations = 0
+        self.stats = instrumentation.ACTIVE  # Reported to once per round if not None
+
+    def fork(self):
+        """
+        Returns a copy of the state with nothing left to admit. The done tasks are shared since they never change again.
+        """
+        state = copy(self)
+        state.last_task = self.next_task
+        state.remaining_burst_time = self.remaining_burst_time[:]
+        state.response_time = self.response_time[:]
+        state.allocated = self.allocated[:]
+        state.ARRIVE_QUEUE = self.ARRIVE_QUEUE.copy(state.remaining_burst_time)
+        state.DONE_LIST = self.DONE_LIST[:]; state.FINISH_TIMES = self.FINISH_TIMES[:]
+        state.sink = self.sink.copy() if self.sink is not None else None
+        return state
+
+class NIRRStreamState(NIRRState):
+    """
+    The state of a NIRR run on the tasks of a TraceSource. The tasks are pulled from the source as TIME reaches their
+    arrival time, and their attributes are kept in dicts (by row) only until they finish, so the memory used is bounded
+    by the queue rather than by the length of the trace.
+    """
+    def __init__(self, source, sink):
+        super().__init__(TaskTable([], [], []), sink)
+        self.source = source
+        self.ids = dict(); self.arrival_time = dict(); self.burst_time = dict()
+        self.remaining_burst_time = dict(); self.response_time = dict(); self.allocated = dict()
+        self.ARRIVE_QUEUE = ReadyQueue(self.remaining_burst_time)
+
+def NIRR(dataset, sink=None):
+    """
+    Implementation of the NIRR algorithm as described in the report. The dataset is a TaskTable
+    (or a list of Tasks), and the done tasks are returned as a TaskTable in the order they finished.
+    A metrics.MetricsSink given as 'sink' is updated as every task finishes, and if it doesn't keep the tasks
+    it is returned in place of the done tasks, which are then never stored.
+    """
+    return _run(NIRRState(as_task_table(dataset), sink))
+
+def NIRR_prefixes(dataset, prefix_lengths: list, sink=None) -> list:
+    """
+    Returns the same as NIRR(dataset[:x]) for every x in prefix_lengths, i.e. the algorithm applied
+    on the x first arrived tasks, but the tasks up to the largest prefix are only admitted once.
+    Right before task x+1 is admitted the run is forked, and the fork is finished without any more tasks,
+    so every fork still serves its own queue until it drains. The run stops at the largest prefix.
+    Every fork gets its own copy of the sink.
+    """
+    forks = sorted(set(prefix_lengths), reverse=True)  # Smallest prefix in the back
+    results = dict()
+    state = NIRRState(as_task_table(dataset), sink)
+    if forks:  # No task after the largest prefix is ever admitted
+        state.last_task = min(state.last_task, forks[0])
+    final_results = _run(state, forks, results)
+
+    # The largest prefix (and any longer one) ends the same way as the main run
+    for x in forks:
+        results[x] = final_results
+    return [results[x] for x in prefix_lengths]
+
+def NIRR_stream(source, sink=None) -> tuple:
+    """
+    Applies the NIRR algorithm on the tasks of a trace_source.TraceSource, pulling them from it as they arrive.
+    The done tasks are never stored, so the metrics are collected in 'sink' (a new metrics.MetricsSink if None)
+    and (sink, CS, NOQTC) is returned.
+    """
+    sink = MetricsSink() if sink is None else sink
+    if sink.keep_tasks:
+        raise ValueError('The done tasks of a streamed run are not kept, use a MetricsSink with keep_tasks=False')
+    return _run(NIRRStreamState(source, sink))
+
+def _run(state: NIRRState, forks=None, results=None):
+    while _step(state, forks, results):
+        pass
+
+    state.CS -= 1 # It never switches from the last task...
+    if not state.keep_done:
+        return state.sink, state.CS, state.number_of_QT_calculations
+    DONE_LIST = state.table.finished(state.DONE_LIST, [state.response_time[task] for task in state.DONE_LIST], state.FINISH_TIMES)
+    return DONE_LIST, state.CS, state.number_of_QT_calculations
+
+def _step(state: NIRRState, forks=None, results=None) -> bool:
+    """
+    Admits the arrived tasks and serves one round, or jumps an idle gap. Returns False once there is nothing left to do.
+    """
+    _admit(state, forks, results)
+    if len(state.ARRIVE_QUEUE) == 0:
+        # The queue drained before the next arrival, jump the idle gap straight to it
+        next_arrival_time = _next_arrival_time(state)
+        if next_arrival_time == float('inf'):
+            return False
+        state.TIME = next_arrival_time
+        return True
+    _round(state)
+    return True
+
+def _next_arrival_time(state: NIRRState) -> float:
+    # The tasks are admitted in arrival order, so the next arrival is the next task to admit (infinity if there is none)
+    if state.source is not None:
+        return state.source.next_arrival_time()
+    return state.arrival_time[state.next_task] if state.next_task < state.last_task else float('inf')
+
+def _admit(state: NIRRState, forks: list, results: dict) -> None:
+    # Insert all the "arrived" tasks in the ARRIVE_QUEUE
+    if state.source is not None:
+        for task in state.source.pull(state):
+            state.ARRIVE_QUEUE.append(task)
+        return
+    while state.next_task < state.last_task and state.arrival_time[state.next_task] <= state.TIME:
+        # Checkpoint the prefixes ending right before this task
+        while forks and forks[-1] == state.next_task:
+            results[forks.pop()] = _run(state.fork())
+        state.ARRIVE_QUEUE.append(state.next_task); state.next_task += 1
+
+def _round(state: NIRRState) -> None:
+    ARRIVE_QUEUE = state.ARRIVE_QUEUE
+    remaining_burst_time = state.remaining_burst_time; allocated = state.allocated
+
+    # Calculate the quantum time, the arrive queue keeps the sum of the remaining burst times
+    state.number_of_QT_calculations += 1
+    if len(ARRIVE_QUEUE) == 1 & int(state.ids[ARRIVE_QUEUE.head()]) == 1:
+            QT = int(state.burst_time[ARRIVE_QUEUE.head()])
+    else:
+        QT = round(ARRIVE_QUEUE.mean_remaining_burst_time())
+
+    # Move all the current tasks in the arrive queue to the REQUEST
+    REQUEST_QUEUE = ARRIVE_QUEUE.drain()
+    REQUEST_QUEUE.sort(key=remaining_burst_time.__getitem__, reverse=True)
+    state.QT = QT
+    tasks_in_round = len(REQUEST_QUEUE)
+
+    TIME = state.TIME
+    while len(REQUEST_QUEUE) > 0:
+        current_task = REQUEST_QUEUE[-1]
+
+        # CPU allocation
+        # print('[CPU] Allocating task: ', current_task, 'QT: ', QT)
+        if not allocated[current_task]:
+            state.response_time[current_task] = TIME - state.arrival_time[current_task]
+            allocated[current_task] = True
+        state.CS += 1
+        if QT >= remaining_burst_time[current_task]: # Finished?
+            TIME += remaining_burst_time[current_task]; remaining_burst_time[current_task] = 0
+            _finish(state, current_task, TIME)
+            REQUEST_QUEUE.pop()
         else:
-            QT = round(np.mean([task.get_remaining_burst_time() for task in REQUEST_QUEUE]))
-            REQUEST_QUEUE.sort(key = lambda TASK: TASK.get_remaining_burst_time(), reverse=True)
-
-        while len(REQUEST_QUEUE) > 0:
-            current_task = REQUEST_QUEUE[-1]
-            
-            # CPU allocation 
-            # print('[CPU] Allocating task: ', current_task.get_id(), 'QT: ', QT)
-            TIME += current_task.allocate_to_CPU(TIME, QT)
-            CS += 1
-            if current_task.get_remaining_burst_time() == 0: # Finished?
-                current_task.is_finished(TIME)
-                DONE_LIST.append(current_task)
-                REQUEST_QUEUE.pop()
+            TIME += QT; remaining_burst_time[current_task] -= QT
 
             # Short enought Bt to finish anyway?
-            elif current_task.get_remaining_burst_time() <= QT/2:
-                # CPU allocation 
-                TIME += current_task.allocate_to_CPU(TIME, QT)
+            if remaining_burst_time[current_task] <= QT/2:
+                # CPU allocation
                 # CS += 1 - NO! The task just stays in the CPU
-                if current_task.get_remaining_burst_time() == 0: # Finished?
-                    current_task.is_finished(TIME)
-                    DONE_LIST.append(current_task)
-                    REQUEST_QUEUE.pop()
+                TIME += remaining_burst_time[current_task]; remaining_burst_time[current_task] = 0
+                _finish(state, current_task, TIME)
+                REQUEST_QUEUE.pop()
 
-            # Move task back to arrive queue 
+            # Move task back to arrive queue
             else:
                 ARRIVE_QUEUE.append(current_task)
                 REQUEST_QUEUE.pop()
+    state.TIME = TIME
+    if state.stats is not None:
+        state.stats.record_round('NIRR', tasks_in_round, len(ARRIVE_QUEUE), tasks_in_round, tasks_in_round, TIME, QT)
 
-        # Insert all the "arrived" tasks in the ARRIVE_QUEUE
-        while len(task_dataset) > 0:
-            if task_dataset[-1].get_arrival_time() <= TIME:
-                ARRIVE_QUEUE.append(task_dataset.pop())
-            else:
-                break
-
-    CS -= 1 # It never switches from the last task... 
-    return DONE_LIST, CS, number_of_QT_calculations
+def _finish(state: NIRRState, task: int, TIME) -> None:
+    if state.keep_done:
+        state.DONE_LIST.append(task); state.FINISH_TIMES.append(TIME)
+    if state.sink is not None:
+        state.sink.add(state.arrival_time[task], int(state.burst_time[task]), state.response_time[task], TIME)
+    if state.source is not None:
+        state.source.finish(state, task, TIME)
@@ -0,0 +1,389 @@
+from copy import copy
+import numpy as np
+import instrumentation
+
+class BatchState:
+    """
+    The state of many independent runs (lanes) of IDRR or NIRR advanced in lockstep, one row per lane in 2-D arrays.
+    Every simulation starts as one lane, and right before the task after one of its evaluated numbers of tasks x is
+    admitted the lane is forked (like algo_1.IDRR_prefixes) into a new state with nothing left to admit, run on its own
+    afterwards so the short queues of the forks are not padded to the long ones. So the tasks of a simulation are only
+    admitted once, whatever the number of prefixes.
+    The queue of a lane is kept compact in the first 'length' columns of its row: columns [0, n_sorted) are in the
+    serving order of the last round, and the tasks admitted since then follow in arrival order until the next round starts.
+    Every queued task finishes in its lane, so the metrics are kept as sums: the arrival and burst times are added when
+    a task is admitted, the start time of its first slice and its finish time when they happen.
+    """
+    LANE_ARRAYS = ('simulation', 'slot', 'next_task', 'last_task', 'next_fork', 'length', 'n_sorted', 'QT', 'TIME', 'CS',
+        'number_of_QT_calculations', 'FIRST_QT', 'arrival_sum', 'burst_sum', 'response_sum', 'finish_sum')
+    TASK_ARRAYS = ('task', 'remaining_burst_time')
+
+    def __init__(self, ids: np.ndarray, arrival_times: np.ndarray, burst_times: np.ndarray, forks: np.ndarray, slots: np.ndarray,
+            last_tasks: np.ndarray):
+        [S, N] = arrival_times.shape
+        self.ids = ids; self.arrival_time = arrival_times; self.burst_time = burst_times  # (simulations, N) in arrival order
+        self.forks = forks; self.fork_slots = slots  # The prefixes every simulation is forked at (sorted, padded with N+1), and their result slots
+        self.arrival_cumsum = np.concatenate((np.zeros((S, 1)), np.cumsum(arrival_times, axis=1)), axis=1)
+        self.burst_cumsum = np.concatenate((np.zeros((S, 1)), np.cumsum(burst_times, axis=1)), axis=1)
+
+        # The arrival times of every simulation in one sorted array, so the arrived tasks of all the lanes take one searchsorted
+        self.first_arrival_time = int(arrival_times.min(initial=0)); self.span = int(arrival_times.max(initial=0)) - self.first_arrival_time + 1
+        self.arrival_times_flat = ((arrival_times - self.first_arrival_time) + self.span*np.arange(S)[:, None]).ravel().astype(np.float64)
+
+        # Per lane: the simulation it runs, its result slot and its tasks [next_task, last_task) still to be admitted
+        self.simulation = np.arange(S); self.slot = slots[:, -1].copy()
+        self.next_task = np.zeros(S, dtype=np.int64); self.last_task = last_tasks
+        self.next_fork = np.zeros(S, dtype=np.int64)  # Index in forks[simulation] of the next fork
+        self.length = np.zeros(S, dtype=np.int64); self.n_sorted = np.zeros(S, dtype=np.int64)
+        self.QT = np.zeros(S); self.TIME = np.zeros(S); self.CS = np.zeros(S, dtype=np.int64)
+        self.number_of_QT_calculations = np.zeros(S, dtype=np.int64); self.FIRST_QT = np.ones(S, dtype=bool)
+        self.arrival_sum = np.zeros(S); self.burst_sum = np.zeros(S); self.response_sum = np.zeros(S); self.finish_sum = np.zeros(S)
+
+        # Per queued task, in the queue order of every lane: its column in the simulation and its remaining burst time
+        self.task = np.zeros((S, 0), dtype=np.int64); self.remaining_burst_time = np.zeros((S, 0))
+        self.stats = instrumentation.ACTIVE  # Reported to once per round (of all the lanes) if not None
+
+    def select(self, lanes: np.ndarray) -> 'BatchState':
+        """
+        Returns a new state with only the lanes in the boolean mask 'lanes', and the queue columns they use.
+        """
+        state = copy(self)
+        width = int(np.max(self.length[lanes], initial=0))
+        for name in self.LANE_ARRAYS:
+            setattr(state, name, getattr(self, name)[lanes])
+        for name in self.TASK_ARRAYS:
+            setattr(state, name, getattr(self, name)[lanes, :width])
+        return state
+
+    def reserve(self, width: int) -> None:
+        """
+        Makes room for queues of 'width' tasks.
+        """
+        if width <= self.task.shape[1]:
+            return
+        width = max(width, 2*self.task.shape[1])
+        self.task = _widen(self.task, width); self.remaining_burst_time = _widen(self.remaining_burst_time, width)
+
+def IDRR_batched(arrival_times: np.ndarray, burst_times: np.ndarray, ids=None, prefix_lengths=None, todo=None) -> dict:
+    """
+    Applies IDRR on the x first tasks of every row of the (simulations, N_tasks) arrays of arrival times (sorted along
+    the rows) and burst times at once, like generate_task_times() returns them, for every x in prefix_lengths
+    (all N_tasks if None). The ids default to 1, 2, ..., N_tasks, and the boolean (simulations, prefixes) mask 'todo'
+    can leave some of them out. Returns the ART, AWT, ATT, CS and NOQTC of every simulation and prefix as
+    (simulations, prefixes) arrays, exactly the same as calculate_results() on algo_1.IDRR (0 where not in todo).
+    """
+    return _run(_state(arrival_times, burst_times, ids, prefix_lengths, todo), _IDRR_new_round, _IDRR_round)
+
+def NIRR_batched(arrival_times: np.ndarray, burst_times: np.ndarray, ids=None, prefix_lengths=None, todo=None) -> dict:
+    """
+    Same as IDRR_batched for the NIRR algorithm, exactly the same as calculate_results() on algo_2.NIRR.
+    """
+    return _run(_state(arrival_times, burst_times, ids, prefix_lengths, todo), _NIRR_new_round, _NIRR_round)
+
+BATCHED_ALGORITHMS = {'IDRR': IDRR_batched, 'NIRR': NIRR_batched}
+
+def evaluate_batched(task_dataset: list, prefix_lengths: list, max_cells=2**22, cache=None) -> dict:
+    """
+    Applies both algorithms on the x first arrived tasks of every simulation in the dataset (a list of TaskTables
+    with the same number of tasks) for every x in prefix_lengths, with every simulation as one lane forked at the prefixes.
+    The simulations are advanced together in blocks of at most max_cells simulations*prefixes*tasks, which bounds the memory.
+    With a result_cache.ResultCache as 'cache' only the (simulation, prefix) runs not in it are computed, and they are added to it.
+    Returns the same as parallel.evaluate_parallel, OUTPUT['IDRR'][n][i] = [ART, AWT, CS, NOQTC].
+    """
+    ids = np.stack([table.id for table in task_dataset])
+    arrival_times = np.stack([table.arrival_time for table in task_dataset])
+    burst_times = np.stack([table.burst_time for table in task_dataset])
+
+    # Prefixes of the whole dataset (or longer) are all the same run
+    [S, N] = arrival_times.shape
+    [unique_prefix_lengths, prefix] = np.unique(np.minimum(prefix_lengths, N), return_inverse=True)
+    simulations_per_block = max(1, max_cells//max(N*len(unique_prefix_lengths), 1))
+
+    OUTPUT = dict()
+    for algo_name, algo in BATCHED_ALGORITHMS.items():
+        metrics = np.zeros((S, len(prefix_lengths), 5))  # ART, AWT, ATT, CS, NOQTC
+        keys = [cache.keys(algo_name, table, prefix_lengths) for table in task_dataset] if cache is not None else None
+        cached = cache.get([key for keys_n in keys for key in keys_n]) if cache is not None else dict()
+        todo = np.zeros((S, len(unique_prefix_lengths)), dtype=bool)
+        for n in range(S):
+            for i, p in enumerate(prefix.tolist()):
+                todo[n, p] |= cache is None or keys[n][i] not in cached
+        simulations = np.flatnonzero(todo.any(axis=1))
+        for start in range(0, len(simulations), simulations_per_block):
+            block = simulations[start:start+simulations_per_block]
+            results = algo(arrival_times[block], burst_times[block], ids[block], unique_prefix_lengths, todo[block])
+            metrics[block] = np.stack([results['ART'], results['AWT'], results['ATT'], results['CS'], results['NOQTC']], axis=2)[:, prefix]
+        if cache is not None:
+            cache.put(algo_name, {keys[n][i]: metrics[n, i].tolist() for n in range(S) for i in range(len(prefix_lengths))
+                if keys[n][i] not in cached})
+            for n in range(S):
+                for i, key in enumerate(keys[n]):
+                    if key in cached:
+                        metrics[n, i] = cached[key]
+        OUTPUT[algo_name] = [[[art, awt, int(cs), int(noqtc)] for art, awt, _, cs, noqtc in metrics_n.tolist()] for metrics_n in metrics]
+    return OUTPUT
+
+def _state(arrival_times, burst_times, ids, prefix_lengths, todo) -> BatchState:
+    arrival_times = np.asarray(arrival_times, dtype=np.int64); burst_times = np.asarray(burst_times, dtype=np.int64)
+    [S, N] = arrival_times.shape
+    ids = np.broadcast_to(np.arange(1, N+1), (S, N)) if ids is None else np.asarray(ids, dtype=np.int64)
+    prefix_lengths = np.minimum(np.array([N] if prefix_lengths is None else prefix_lengths, dtype=np.int64), N)
+    todo = np.ones((S, len(prefix_lengths)), dtype=bool) if todo is None else np.asarray(todo, dtype=bool)
+
+    # The prefixes in todo of every simulation first and sorted, the others padded with N+1
+    order = np.argsort(prefix_lengths, kind='stable')
+    wanted = todo[:, order]
+    by_prefix = np.argsort(~wanted, axis=1, kind='stable')
+    forks = np.take_along_axis(np.where(wanted, prefix_lengths[order], N+1), by_prefix, axis=1)
+    slots = np.take_along_axis(np.broadcast_to(order, wanted.shape), by_prefix, axis=1)
+
+    # Every simulation runs up to its largest prefix, and is forked at the smaller ones
+    N_wanted = wanted.sum(axis=1); largest = np.maximum(N_wanted - 1, 0)[:, None]
+    last_tasks = np.where(N_wanted > 0, np.take_along_axis(forks, largest, axis=1)[:, 0], 0)
+    main_slots = np.take_along_axis(slots, largest, axis=1)
+    forks = np.where(np.arange(forks.shape[1]) < largest, forks, N+1)
+    return BatchState(ids, arrival_times, burst_times, np.concatenate((forks, np.full((S, 1), N+1)), axis=1),
+        np.concatenate((slots, main_slots), axis=1), last_tasks)
+
+def _run(state: BatchState, new_round, round) -> dict:
+    [S, P] = [state.forks.shape[0], state.forks.shape[1] - 1]
+    RESULTS = {'ART': np.zeros((S, P)), 'AWT': np.zeros((S, P)), 'ATT': np.zeros((S, P)),
+        'CS': np.zeros((S, P), dtype=np.int64), 'NOQTC': np.zeros((S, P), dtype=np.int64)}
+    states = [state.select(state.last_task > 0)]
+    while states:
+        state = states.pop()
+        while len(state.length) > 0:
+            states += _admit(state)
+
+            # Lanes whose queue drained before their next arrival jump the idle gap straight to it
+            idle = (state.length == 0) & (state.next_task < state.last_task)
+            if idle.any():
+                next_task = np.minimum(state.next_task, state.arrival_time.shape[1] - 1)
+                state.TIME = np.where(idle, state.arrival_time[state.simulation, next_task], state.TIME)
+                states += _admit(state)
+
+            # The lanes with nothing left are done, their rows are dropped
+            done = state.length == 0
+            if done.any():
+                N = state.last_task[done]
+                for metric, values in [('ART', (state.response_sum[done] - state.arrival_sum[done])/N),
+                        ('AWT', (state.finish_sum[done] - state.arrival_sum[done] - state.burst_sum[done])/N),
+                        ('ATT', (state.finish_sum[done] - state.arrival_sum[done])/N),
+                        ('CS', state.CS[done] - 1),  # It never switches from the last task...
+                        ('NOQTC', state.number_of_QT_calculations[done])]:
+                    RESULTS[metric][state.simulation[done], state.slot[done]] = values
+                state = state.select(~done)
+                if len(state.length) == 0:
+                    break
+            new_round(state)
+            round(state)
+    return RESULTS
+
+def _admit(state: BatchState) -> list:
+    # Insert all the "arrived" tasks, forking the lanes right before the task after one of their prefixes.
+    # The number of arrived tasks of every lane comes from one searchsorted over all the simulations
+    N = state.arrival_time.shape[1]
+    TIME = np.clip(state.TIME - state.first_arrival_time, -0.5, state.span - 0.5) + state.span*state.simulation
+    arrived = np.searchsorted(state.arrival_times_flat, TIME, side='right') - N*state.simulation
+    arrived = np.maximum(np.minimum(arrived, state.last_task), state.next_task)
+
+    FORKS = list()
+    while True:
+        fork = state.forks[state.simulation, state.next_fork]
+        forked = fork < arrived
+        if not forked.any():
+            break
+        _push(state, np.where(forked, fork, state.next_task))
+        forked_state = state.select(forked)
+        forked_state.last_task = forked_state.next_task.copy()
+        forked_state.slot = state.fork_slots[forked_state.simulation, forked_state.next_fork]
+        forked_state.next_fork = np.full(len(forked_state.length), state.forks.shape[1] - 1)  # The padding, never forked again
+        FORKS.append(forked_state)
+        state.next_fork[forked] += 1
+    _push(state, arrived)
+
+    # The forks of queues at most twice as short as the longest ones are run together, there is one state per round otherwise
+    FORKS.sort(key=lambda forked_state: forked_state.task.shape[1], reverse=True)
+    GROUPS = list()
+    for forked_state in FORKS:
+        if GROUPS and 2*forked_state.task.shape[1] >= GROUPS[-1][0].task.shape[1]:
+            GROUPS[-1].append(forked_state)
+        else:
+            GROUPS.append([forked_state])
+    return [_concatenate(group) for group in GROUPS]
+
+def _concatenate(states: list) -> BatchState:
+    # The lanes of all the states in one, padding the queues to the longest
+    if len(states) == 1:
+        return states[0]
+    state = copy(states[0])
+    width = max(other.task.shape[1] for other in states)
+    for name in BatchState.LANE_ARRAYS:
+        setattr(state, name, np.concatenate([getattr(other, name) for other in states]))
+    for name in BatchState.TASK_ARRAYS:
+        setattr(state, name, np.concatenate([_widen(getattr(other, name), width) for other in states]))
+    return state
+
+def _widen(array: np.ndarray, width: int) -> np.ndarray:
+    # The array with zero columns added up to 'width'
+    if array.shape[1] == width:
+        return array
+    widened = np.zeros((array.shape[0], width), dtype=array.dtype)
+    widened[:, :array.shape[1]] = array
+    return widened
+
+def _push(state: BatchState, arrived: np.ndarray) -> None:
+    # Appends the tasks [next_task, arrived) of every lane to its queue, in arrival order
+    count = arrived - state.next_task
+    total = int(count.sum())
+    if total == 0:
+        return
+    state.reserve(int(np.max(state.length + count)))
+    lanes = np.repeat(np.arange(len(count)), count)
+    offsets = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+    tasks = state.next_task[lanes] + offsets; columns = state.length[lanes] + offsets
+    state.task[lanes, columns] = tasks
+    state.remaining_burst_time[lanes, columns] = state.burst_time[state.simulation[lanes], tasks]
+    state.arrival_sum += state.arrival_cumsum[state.simulation, arrived] - state.arrival_cumsum[state.simulation, state.next_task]
+    state.burst_sum += state.burst_cumsum[state.simulation, arrived] - state.burst_cumsum[state.simulation, state.next_task]
+    state.length += count; state.next_task = arrived
+
+def _start_round(state: BatchState, reverse_ties: bool) -> tuple:
+    """
+    Puts the queue of every lane in serving order: shortest remaining burst time first, and the later admitted task first on ties.
+    The tasks served in the last round are already in that order (all of them got the same time slice), so the admitted
+    ones are put before them in reverse and one stable sort merges them in. With reverse_ties (NIRR) the ties among the
+    served tasks are reversed first, since they are served last in first out. Returns the width of the queues,
+    the mask of the queued tasks and the mask of the admitted tasks (None if there are none).
+    """
+    width = int(np.max(state.length, initial=0))
+    columns = np.arange(width)
+    queued = columns < state.length[:, None]
+    remaining_burst_time = state.remaining_burst_time[:, :width]
+    order = None
+
+    if reverse_ties and width > 1:
+        # Every run of equal remaining burst times among the served tasks, reversed
+        served = columns < state.n_sorted[:, None]
+        same = served[:, 1:] & (remaining_burst_time[:, 1:] == remaining_burst_time[:, :-1])
+        if same.any():
+            edge = np.ones((len(same), 1), dtype=bool)
+            starts = np.maximum.accumulate(np.where(np.concatenate((edge, ~same), axis=1), columns, 0), axis=1)
+            ends = np.minimum.accumulate(np.where(np.concatenate((~same, edge), axis=1), columns, width)[:, ::-1], axis=1)[:, ::-1]
+            order = np.where(served, starts + ends - columns, columns)
+
+    admitted = (state.length - state.n_sorted)[:, None]
+    state.sorted_elements = int(admitted.sum())
+    new = None
+    if state.sorted_elements > 0:
+        # The admitted tasks from the last one, then the served ones, sorted by remaining burst time keeping that order on ties
+        served_order = columns - admitted if order is None else np.take_along_axis(order, np.maximum(columns - admitted, 0), axis=1)
+        runs = np.where(columns < admitted, state.length[:, None] - 1 - columns, np.where(queued, served_order, columns))
+        keys = np.where(queued, 2*np.take_along_axis(remaining_burst_time, runs, axis=1), np.inf)
+        if np.max(keys, where=queued, initial=0) < np.iinfo(np.int16).max and np.all((keys == np.round(keys)) | ~queued):
+            # The remaining burst times are half-integers, as small integers numpy sorts them with a radix sort
+            keys = np.minimum(keys, np.iinfo(np.int16).max).astype(np.int16)
+        merged = np.argsort(keys, axis=1, kind='stable')
+        new = merged < admitted
+        order = np.take_along_axis(runs, merged, axis=1)
+
+    if order is not None:
+        for name in BatchState.TASK_ARRAYS:
+            array = getattr(state, name)
+            array[:, :width] = np.take_along_axis(array[:, :width], order, axis=1)
+    state.n_sorted = state.length.copy()
+    return width, queued, new
+
+def _IDRR_new_round(state: BatchState) -> None:
+    [width, queued, state.new] = _start_round(state, False)
+    count = state.length
+    remaining_burst_time = state.remaining_burst_time[:, :width]
+    max_1 = np.take_along_axis(remaining_burst_time, (count-1)[:, None], axis=1)[:, 0]
+    max_2 = np.take_along_axis(remaining_burst_time, np.maximum(count-2, 0)[:, None], axis=1)[:, 0]
+
+    # The two smallest arrival times are the ones of the two first arrived (smallest) tasks
+    N = state.arrival_time.shape[1]
+    tasks = np.where(queued, state.task[:, :width], N)
+    smallest = np.minimum(np.partition(tasks, 1, axis=1)[:, :2] if width > 1 else np.repeat(tasks, 2, axis=1), N - 1)
+    first_arrival_time = state.arrival_time[state.simulation, smallest[:, 0]]
+    second_arrival_time = state.arrival_time[state.simulation, smallest[:, 1]]
+
+    # Calculate the quantum time
+    first_QT = (count > 1) & (state.number_of_QT_calculations == 0)
+    second_QT = (count > 1) & (state.number_of_QT_calculations > 0) & state.FIRST_QT
+    later_QT = (count > 1) & (state.number_of_QT_calculations > 0) & ~state.FIRST_QT
+    QT = np.where(count == 1, max_1, state.QT)
+    QT = np.where(first_QT, np.round(max_1 + max_2)/2, QT)
+    QT = np.where(second_QT, np.round(max_1 + state.QT)/2 - np.round(first_arrival_time + second_arrival_time)/2, QT)
+    state.QT = np.where(later_QT, np.round(max_1 + state.QT)/2 - np.round(first_arrival_time/2), QT)
+    state.FIRST_QT &= ~second_QT
+    state.number_of_QT_calculations += 1
+
+    # Edge case, but can happen even with a reasonable dataset. A single first task is never checked,
+    # the QT is recalculated right after its allocation anyway
+    zero_QT = (state.QT <= 0) & ((state.number_of_QT_calculations > 1) | (count > 1))
+    if zero_QT.any():
+        raise ValueError(f'[IDRR] QT calculated to: {state.QT[np.argmax(zero_QT)].item()}')
+
+def _IDRR_round(state: BatchState) -> None:
+    width = int(np.max(state.length, initial=0))
+    queued = np.arange(width) < state.length[:, None]
+    remaining_burst_time = np.where(queued, state.remaining_burst_time[:, :width], 0)
+    finished = queued & (state.QT[:, None] >= remaining_burst_time)
+    slices = np.where(queued, np.where(finished, remaining_burst_time, state.QT[:, None]), 0)
+    _serve(state, width, queued, remaining_burst_time, slices, finished)
+    _record_round(state, 'IDRR', queued, finished)
+
+def _NIRR_new_round(state: BatchState) -> None:
+    [width, queued, state.new] = _start_round(state, True)
+    count = state.length
+    sole_id = state.ids[state.simulation, state.task[:, 0]]
+    sole_burst_time = state.burst_time[state.simulation, state.task[:, 0]]
+
+    # Calculate the quantum time
+    mean_remaining_burst_time = np.sum(np.where(queued, state.remaining_burst_time[:, :width], 0), axis=1)/count
+    state.QT = np.where((count == 1) & (sole_id % 2 == 1), sole_burst_time, np.round(mean_remaining_burst_time))
+    state.number_of_QT_calculations += 1
+
+def _NIRR_round(state: BatchState) -> None:
+    width = int(np.max(state.length, initial=0)); QT = state.QT[:, None]
+    queued = np.arange(width) < state.length[:, None]
+    remaining_burst_time = np.where(queued, state.remaining_burst_time[:, :width], 0)
+
+    # A task that is not finished by its first slice but has at most QT/2 left stays in the CPU and finishes
+    first_slices = np.minimum(remaining_burst_time, QT)
+    left = remaining_burst_time - first_slices
+    finished = queued & ((left == 0) | (left <= QT/2))
+    slices = np.where(queued, np.where(finished, remaining_burst_time, first_slices), 0)
+    _serve(state, width, queued, remaining_burst_time, slices, finished)
+    _record_round(state, 'NIRR', queued, finished)
+
+def _record_round(state: BatchState, algo_name: str, queued: np.ndarray, finished: np.ndarray) -> None:
+    # One round of every lane
+    if state.stats is not None:
+        allocations = int(np.sum(queued))
+        state.stats.record_round(algo_name, allocations, allocations - int(np.sum(finished)), state.sorted_elements,
+            int(np.max(state.length, initial=0)), lanes=len(state.length))
+
+def _serve(state: BatchState, width: int, queued, remaining_burst_time, slices, finished) -> None:
+    """
+    Serves the queued tasks of every lane in serving order, each for its time in 'slices', adds the start times of
+    the first slices and the finish times to the sums of the lane and drops the finished tasks from the queue.
+    The others stay in serving order.
+    """
+    finish_times = state.TIME[:, None] + np.cumsum(slices, axis=1)
+    if state.new is not None:
+        state.response_sum += np.sum(np.where(state.new, finish_times - slices, 0), axis=1)
+    state.finish_sum += np.sum(np.where(finished, finish_times, 0), axis=1)
+    state.TIME = finish_times[:, -1]; state.CS += state.length
+
+    # The tasks left, moved to the front of the queue in the same order
+    state.remaining_burst_time[:, :width] = remaining_burst_time - slices
+    N_finished = np.sum(finished, axis=1)
+    if N_finished.any():
+        order = np.argsort(finished | ~queued, axis=1, kind='stable')
+        for name in BatchState.TASK_ARRAYS:
+            array = getattr(state, name)
+            array[:, :width] = np.take_along_axis(array[:, :width], order, axis=1)
+        state.length -= N_finished
+    state.n_sorted = state.length.copy()
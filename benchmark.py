@@ -0,0 +1,196 @@
+"""
+Benchmarks of the separate parts of the simulation: IDRR and NIRR (with every engine), generate_dataset and calculate_results,
+swept over the number of tasks, the arrival/burst time bound regimes and uniform/normal burst times.
+
+    python benchmark.py run --output benchmark.json
+    python benchmark.py compare baseline.json benchmark.json
+
+'run' writes the tasks/s, allocations/s, peak memory and the fitted complexity exponent (time ~ N_tasks^k) to a .json file.
+'compare' flags every case that got slower (or used more memory) than the baseline by more than the tolerance,
+and exits with status 1 if there is any regression.
+"""
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+from time import perf_counter, strftime
+import numpy as np
+from helper_scripts import generate_task_tables, generate_dataset, calculate_results
+from parallel import ALGORITHMS
+from batched import BATCHED_ALGORITHMS
+
+# The (arrival_time_bounds, burst_time_bounds) regimes: all tasks arriving at once up to tasks arriving far apart,
+# and short or long burst times at the default arrival bounds
+REGIMES = {
+    'at_once': ([0, 0], [1, 50]),
+    'dense': ([0, 30], [1, 50]),
+    'sparse': ([0, 500], [1, 50]),
+    'short_burst': ([0, 30], [1, 5]),
+    'long_burst': ([0, 30], [1, 500])}
+DISTRIBUTIONS = ['uniform', 'normal']
+N_TASKS = [10, 100, 1000, 10000, 100000, 1000000]
+ENGINES = ['loop', 'round', 'batched']
+
+def run_algorithm(algo_name: str, engine: str, table) -> int:
+    """
+    Applies the algorithm on the TaskTable and returns the number of CPU allocations.
+    """
+    if engine == 'batched':
+        results = BATCHED_ALGORITHMS[algo_name](table.arrival_time[None], table.burst_time[None])
+        return int(results['CS'][0, 0]) + 1
+    [_, CS, _] = ALGORITHMS[algo_name][engine][0](table)
+    return CS + 1  # It never switches from the last task...
+
+def measure(function, repeat: int, memory=True) -> dict:
+    """
+    Returns the best wall time of 'repeat' calls of function(), its return value and the peak memory of one more,
+    traced, call. The time is measured without tracing since tracemalloc slows down every allocation.
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        value = function()
+        seconds = min(seconds, perf_counter() - start)
+
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'seconds': seconds, 'value': value, 'peak_memory': peak_memory}
+
+def benchmark(N_tasks=N_TASKS, regimes=REGIMES.keys(), distributions=DISTRIBUTIONS, engines=ENGINES, repeat=3, max_seconds=30.0,
+        memory=True, seed=0) -> dict:
+    """
+    Times every part of the simulation on every case. Once a part has taken longer than max_seconds for a case
+    it is skipped for the larger numbers of tasks. An IDRR run ending in a QT <= 0 is recorded with its error.
+    """
+    parts = [(algo_name, engine) for algo_name in ALGORITHMS for engine in engines] + [('generate_dataset', None), ('calculate_results', None)]
+    RESULTS = list()
+    for regime in regimes:
+        [arrival_time_bounds, burst_time_bounds] = REGIMES[regime]
+        for distribution in distributions:
+            uniform = distribution == 'uniform'; normal = not uniform
+            too_slow = set()
+            for N in sorted(N_tasks):
+                table = generate_task_tables(1, N, arrival_time_bounds, burst_time_bounds, uniform, normal, seed)[0]
+                for function, engine in parts:
+                    if (function, engine) in too_slow:
+                        continue
+                    case = {'function': function, 'engine': engine, 'regime': regime, 'distribution': distribution, 'N_tasks': N}
+                    if function == 'generate_dataset':
+                        call = lambda: generate_dataset(1, N, arrival_time_bounds, burst_time_bounds, uniform, normal, seed)
+                    elif function == 'calculate_results':
+                        [done_tasks, CS, NOQTC] = ALGORITHMS['NIRR']['round'][0](table)
+                        call = lambda: calculate_results('NIRR', done_tasks, CS, NOQTC)
+                    else:
+                        call = lambda: run_algorithm(function, engine, table)
+
+                    try:
+                        measured = measure(call, repeat, memory)
+                    except ValueError as error:
+                        RESULTS.append(dict(case, error=str(error)))
+                        print(_format(case), error)
+                        continue
+
+                    case.update(seconds=measured['seconds'], tasks_per_s=N/measured['seconds'], peak_memory=measured['peak_memory'])
+                    if function in ALGORITHMS:
+                        case.update(allocations=measured['value'], allocations_per_s=measured['value']/measured['seconds'])
+                    RESULTS.append(case)
+                    print(_format(case), f"{measured['seconds']:.4f} s, {N/measured['seconds']:.0f} tasks/s")
+                    if measured['seconds'] > max_seconds:
+                        too_slow.add((function, engine))
+
+    return {'meta': {'date': strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'repeat': repeat, 'seed': seed},
+        'results': RESULTS, 'exponents': complexity_exponents(RESULTS)}
+
+def complexity_exponents(results: list, min_seconds=1e-4) -> list:
+    """
+    Fits time = c*N_tasks^k (least squares in log-log) for every part and case with at least two
+    measurements longer than min_seconds, shorter ones are mostly overhead.
+    """
+    curves = dict()
+    for result in results:
+        if 'seconds' in result and result['seconds'] >= min_seconds:
+            curves.setdefault(_key(result)[:-1], list()).append((result['N_tasks'], result['seconds']))
+
+    EXPONENTS = list()
+    for (function, engine, regime, distribution), points in curves.items():
+        if len(points) < 2:
+            continue
+        [N, seconds] = np.log(np.array(points)).T
+        [k, _] = np.polyfit(N, seconds, 1)
+        EXPONENTS.append({'function': function, 'engine': engine, 'regime': regime, 'distribution': distribution, 'exponent': float(k)})
+    return EXPONENTS
+
+def compare(baseline: dict, current: dict, tolerance=0.1, min_seconds=1e-3) -> list:
+    """
+    Returns the cases of 'current' that are slower, or use more memory, than in 'baseline' by more than the tolerance
+    (a fraction). Times shorter than min_seconds are too noisy to compare.
+    """
+    baseline_results = {_key(result): result for result in baseline['results']}
+    REGRESSIONS = list()
+    for result in current['results']:
+        base = baseline_results.get(_key(result))
+        if base is None or 'seconds' not in base or 'seconds' not in result:
+            continue
+        if max(base['seconds'], result['seconds']) >= min_seconds and result['seconds'] > (1 + tolerance)*base['seconds']:
+            REGRESSIONS.append(dict(result, metric='seconds', baseline=base['seconds'], ratio=result['seconds']/base['seconds']))
+        if base.get('peak_memory') and result.get('peak_memory') and result['peak_memory'] > (1 + tolerance)*base['peak_memory']:
+            REGRESSIONS.append(dict(result, metric='peak_memory', baseline=base['peak_memory'], ratio=result['peak_memory']/base['peak_memory']))
+    return REGRESSIONS
+
+def _key(result: dict) -> tuple:
+    return result['function'], result['engine'], result['regime'], result['distribution'], result['N_tasks']
+
+def _name(result: dict) -> str:
+    return result['function'] if result['engine'] is None else f"{result['function']} ({result['engine']})"
+
+def _format(result: dict) -> str:
+    return f"{_name(result):<18} {result['regime']:<11} {result['distribution']:<8} N = {result['N_tasks']:<8}"
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of the scheduling algorithms and the simulation steps.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='Run the benchmarks and write the results to a .json file.')
+    run.add_argument('--N-tasks', type=int, nargs='+', default=N_TASKS)
+    run.add_argument('--regimes', nargs='+', choices=list(REGIMES), default=list(REGIMES))
+    run.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    run.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES)
+    run.add_argument('--repeat', type=int, default=3, help='Best of this many runs.')
+    run.add_argument('--max-seconds', type=float, default=30.0, help='Skip the larger cases of a part once it takes longer than this.')
+    run.add_argument('--no-memory', action='store_true', help='Skip the (traced) peak memory measurements.')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--output', default='benchmark.json')
+    comparison = commands.add_parser('compare', help='Flag the regressions of a benchmark against a baseline.')
+    comparison.add_argument('baseline')
+    comparison.add_argument('current')
+    comparison.add_argument('--tolerance', type=float, default=0.1, help='Allowed slowdown, as a fraction.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = benchmark(args.N_tasks, args.regimes, args.distributions, args.engines, args.repeat, args.max_seconds,
+            not args.no_memory, args.seed)
+        with open(args.output, 'w') as fid:
+            json.dump(results, fid, indent=2)
+        for exponent in results['exponents']:
+            print(f"{_name(exponent):<18} {exponent['regime']:<11} {exponent['distribution']:<8} O(N^{exponent['exponent']:.2f})")
+        print(f'Results written to {args.output}')
+        return 0
+
+    with open(args.baseline) as fid:
+        baseline = json.load(fid)
+    with open(args.current) as fid:
+        current = json.load(fid)
+    regressions = compare(baseline, current, args.tolerance)
+    for regression in regressions:
+        print(_format(regression), f"{regression['metric']}: {regression['baseline']:.4g} -> {regression[regression['metric']]:.4g}",
+            f"({regression['ratio']:.2f}x)")
+    print(f'{len(regressions)} regression(s) with a tolerance of {100*args.tolerance:.0f}%')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import numpy as np
+from metrics import MetricsSink
 
 class Task:
     """
@@ -51,7 +52,177 @@ class Task:
         self.finish_time = time
         self.calculate_results()
 
-def generate_dataset(N_simulations: int, N_tasks: int, ART_bound: list, BT_bound: list, uniform=True, normal=False) -> list:
+class TaskTable:
+    """
+    This is the array backed store of all the tasks in one simulation, one NumPy array per attribute instead 
+    of one Task object per task. The rows are in the order the tasks arrive (the reverse of a generate_dataset() list), 
+    so the x first arrived tasks are simply table[:x]. The remaining, response and finish times are floats since 
+    the IDRR QT can be a half integer. Indexing with an int gives a TaskView, which has the same API as a Task. 
+    """
+    def __init__(self, id, arrival_time, burst_time):
+        self.id = np.asarray(id, dtype=np.int64)
+        self.arrival_time = np.asarray(arrival_time, dtype=np.int64)
+        self.burst_time = np.asarray(burst_time, dtype=np.int64)
+        self.reset()
+
+    @classmethod
+    def from_tasks(cls, tasks: list) -> 'TaskTable':
+        """
+        Builds the table from a list of Tasks in reverse sorted order after arrival time, as in generate_dataset().
+        """
+        data = np.array([task.data for task in reversed(tasks)], dtype=np.int64).reshape(-1, 3)
+        return cls(data[:, 0], data[:, 1], data[:, 2])
+
+    def to_tasks(self) -> list:
+        """
+        Returns the table as new Task objects, in reverse sorted order after arrival time as in generate_dataset(). 
+        """
+        return [Task(id, arrival_time, burst_time) for id, arrival_time, burst_time 
+            in zip(self.id[::-1].tolist(), self.arrival_time[::-1].tolist(), self.burst_time[::-1].tolist())]
+
+    def reset(self) -> None:
+        """
+        Puts every task back in its state before a run, i.e. not allocated and with all the burst time remaining. 
+        """
+        self.remaining_burst_time = self.burst_time.astype(np.float64)
+        self.response_time = np.zeros(len(self.id))
+        self.finish_time = np.zeros(len(self.id))
+        self.allocated = np.zeros(len(self.id), dtype=bool)
+
+    def copy(self) -> 'TaskTable':
+        """
+        Returns a copy of the table. The id, arrival time and burst time never change and are shared. 
+        """
+        table = TaskTable.__new__(TaskTable)
+        table.id = self.id; table.arrival_time = self.arrival_time; table.burst_time = self.burst_time
+        table.remaining_burst_time = self.remaining_burst_time.copy(); table.response_time = self.response_time.copy()
+        table.finish_time = self.finish_time.copy(); table.allocated = self.allocated.copy()
+        return table
+
+    def take(self, rows) -> 'TaskTable':
+        """
+        Returns a new table with the given rows (a slice or an array of row numbers), in the given order.
+        """
+        table = TaskTable.__new__(TaskTable)
+        for name in ['id', 'arrival_time', 'burst_time', 'remaining_burst_time', 'response_time', 'finish_time', 'allocated']:
+            setattr(table, name, getattr(self, name)[rows])
+        if isinstance(rows, slice):  # Slices of NumPy arrays are views
+            table.remaining_burst_time = table.remaining_burst_time.copy(); table.response_time = table.response_time.copy()
+            table.finish_time = table.finish_time.copy(); table.allocated = table.allocated.copy()
+        return table
+
+    def finished(self, rows: list, response_time: list, finish_time: list) -> 'TaskTable':
+        """
+        Returns the table of the finished tasks 'rows', in the order they finished, with their response and finish times. 
+        """
+        table = self.take(np.array(rows, dtype=np.int64))
+        table.remaining_burst_time[:] = 0; table.allocated[:] = True
+        table.response_time[:] = response_time; table.finish_time[:] = finish_time
+        return table
+
+    @property
+    def turnaround_time(self) -> np.ndarray:
+        return self.finish_time - self.arrival_time
+
+    @property
+    def waiting_time(self) -> np.ndarray:
+        return self.turnaround_time - self.burst_time
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(key)
+        return TaskView(self, range(len(self.id))[key])
+
+    def __iter__(self):
+        return (TaskView(self, row) for row in range(len(self.id)))
+
+    def __repr__(self) -> str:
+        return f'TaskTable({len(self)} tasks)'
+
+class TaskView(Task):
+    """
+    A Task that reads and writes one row of a TaskTable, for code written against the Task API. 
+    The waiting and turnaround times are derived from the finish time. 
+    """
+    def __init__(self, table: TaskTable, row: int):
+        self.table = table
+        self.row = row
+
+    data = property(lambda self: [int(self.table.id[self.row]), int(self.table.arrival_time[self.row]), int(self.table.burst_time[self.row])])
+    turnaround_time = property(lambda self: float(self.table.finish_time[self.row] - self.table.arrival_time[self.row]))
+    waiting_time = property(lambda self: self.turnaround_time - float(self.table.burst_time[self.row]))
+
+    def _column(name: str, to_python):
+        def set_value(self, value):
+            getattr(self.table, name)[self.row] = value
+        return property(lambda self: to_python(getattr(self.table, name)[self.row]), set_value)
+
+    allocated = _column('allocated', bool)
+    response_time = _column('response_time', float)
+    remaining_burst_time = _column('remaining_burst_time', float)
+    finish_time = _column('finish_time', float)
+    del _column
+
+    def calculate_results(self) -> None:
+        pass  # Nothing to store, the waiting and turnaround times are derived
+
+def as_task_table(dataset) -> TaskTable:
+    """
+    Returns the dataset of one simulation as a TaskTable, converting it if it is a list of Tasks. 
+    """
+    if isinstance(dataset, TaskTable):
+        return dataset
+    return TaskTable.from_tasks(dataset)
+
+def generate_task_times(N_simulations: int, N_tasks: int, ART_bound: list, BT_bound: list, uniform=True, normal=False, seed=None,
+        first_simulation=0) -> tuple:
+    """
+    This function draws the arrival times and burst times of all the tasks in all the simulations at once, 
+    and returns them as two int arrays of shape (N_simulations, N_tasks). The arrival times are sorted along every row
+    and the first one is forced to 0, so row n holds the tasks of simulation n in arrival order (task number i+1 in column i).
+    The distributions are the same as in generate_dataset(). Every simulation has its own random stream spawned from 'seed', 
+    so the same seed always gives the same tasks, and simulation n does not depend on how many simulations are generated.
+    With first_simulation = k the simulations k, k+1, ... are generated.
+    """
+    if (uniform and normal) or (not uniform and not normal):
+        raise InterruptedError("Choose either uniform or normal!!")
+
+    arrival_times = np.empty((N_simulations, N_tasks), dtype=np.int64)
+    burst_times = np.empty((N_simulations, N_tasks), dtype=np.int64)
+    for n, rng in enumerate(simulation_generators(N_simulations, seed, first_simulation)):
+        arrival_times[n] = rng.uniform(ART_bound[0], ART_bound[1], N_tasks)  # Truncated like int()
+        if uniform:
+            burst_times[n] = rng.uniform(BT_bound[0], BT_bound[1], N_tasks)
+        elif normal:
+            bt = rng.normal(loc=int(np.mean(BT_bound)), scale=int(1/4*(BT_bound[1] - BT_bound[0])), size=N_tasks)
+            burst_times[n] = np.round(np.maximum(bt, 0))
+    arrival_times.sort(axis=1)
+    arrival_times[:, 0] = 0 # Need to force this 
+
+    return arrival_times, burst_times
+
+def simulation_generators(N_simulations: int, seed=None, first_simulation=0) -> list:
+    """
+    Returns one independent random Generator per simulation, all spawned from the same seed, for the simulations
+    first_simulation, first_simulation+1, ...
+    """
+    sequence = np.random.SeedSequence(seed)
+    sequence.spawn(first_simulation)  # Skipped
+    return [np.random.default_rng(child) for child in sequence.spawn(N_simulations)]
+
+def generate_task_tables(N_simulations: int, N_tasks: int, ART_bound: list, BT_bound: list, uniform=True, normal=False, seed=None,
+        first_simulation=0) -> list:
+    """
+    This function generates the dataset as one TaskTable per simulation, with the tasks from generate_task_times(). 
+    """
+    [arrival_times, burst_times] = generate_task_times(N_simulations, N_tasks, ART_bound, BT_bound, uniform, normal, seed, first_simulation)
+    ids = np.arange(1, N_tasks+1)
+    return [TaskTable(ids, arrival_times[n], burst_times[n]) for n in range(N_simulations)]
+
+def generate_dataset(N_simulations: int, N_tasks: int, ART_bound: list, BT_bound: list, uniform=True, normal=False, seed=None) -> list:
     """
     This function generates the dataset, which will be a list of the class Tasks. 
     It takes the number of simulations, number of tasks, and the arrival time burst time bounds 
@@ -59,43 +230,44 @@ def generate_dataset(N_simulations: int, N_tasks: int, ART_bound: list, BT_bound
     where the task number and arrival time need to match. The first Tasks for each number of simulation
     (hence being last in the list) is forced to have 0 arrival time. 
     """
-    OUTPUT = list()
-    for _ in range(0, N_simulations):
-        arrival_times = list()
-        tasks_n = list()
-        for _ in range(N_tasks):
-            arrival_times.append(int(np.random.uniform(ART_bound[0], ART_bound[1])))
-        arrival_times.sort(reverse=True)
-
-        arrival_times[N_tasks-1] = 0 # Need to force this 
-
-        for art, i in zip(arrival_times, range(N_tasks)):
-            if uniform:
-                bt = int(np.random.uniform(BT_bound[0], BT_bound[1]))
-            elif normal:
-                bt  = np.random.default_rng().normal(loc=int(np.mean(BT_bound)), scale=int(1/4*(BT_bound[1] - BT_bound[0])))
-                bt = round(max(bt, 0))
-            tasks_n.append(Task(N_tasks-i, art, bt))
-        OUTPUT.append(tasks_n)
-        
-    return OUTPUT
+    return [table.to_tasks() for table in generate_task_tables(N_simulations, N_tasks, ART_bound, BT_bound, uniform, normal, seed)]
 
-def calculate_results(algo_name: str, results: list, CS, NOQTC: int, print_results=False, print_by_task=False) -> list:
+def pack_dataset(task_dataset: list) -> np.ndarray:
+    """
+    Packs a list of TaskTables (one per simulation, all with the same number of tasks) into one int array of shape
+    (N_simulations, N_tasks, 3), holding the id, arrival time and burst time of every task in arrival order. 
+    This is far cheaper to send to other processes than the Task objects themselves. 
+    """
+    return np.stack([np.stack([table.id, table.arrival_time, table.burst_time], axis=1) for table in task_dataset])
+
+def unpack_tasks(packed_tasks: np.ndarray) -> TaskTable:
+    """
+    Rebuilds the TaskTable of one simulation from its (N_tasks, 3) part of pack_dataset(). 
+    """
+    return TaskTable(packed_tasks[:, 0], packed_tasks[:, 1], packed_tasks[:, 2])
+
+def calculate_results(algo_name: str, results, CS, NOQTC: int, print_results=False, print_by_task=False) -> list:
     """
     This function calculates the average response time, average waiting time and average turnaround time, 
-    and returns these results as separate integers. The input is the result from a single run of one of the two algorithms. 
+    and returns these results as separate integers. The input is the result from a single run of one of the two algorithms
+    (a TaskTable, a list of Tasks, or a MetricsSink that was updated as the tasks finished). 
     Extra arguments can be added to print the results. 
     """
-    ART = 0; AWT = 0; ATT = 0
-    for done_task in results:
-        ART += done_task.response_time; AWT += done_task.waiting_time; ATT += done_task.turnaround_time
+    if isinstance(results, TaskTable):
+        ART = float(np.sum(results.response_time)); AWT = float(np.sum(results.waiting_time)); ATT = float(np.sum(results.turnaround_time))
+    elif isinstance(results, MetricsSink):
+        ART = results.response_time.total; AWT = results.waiting_time.total; ATT = results.turnaround_time.total
+    else:
+        ART = 0; AWT = 0; ATT = 0
+        for done_task in results:
+            ART += done_task.response_time; AWT += done_task.waiting_time; ATT += done_task.turnaround_time
     ART = ART/len(results); AWT = AWT/len(results); ATT = ATT/len(results)   
 
     if print_results:
         print(f'\nSummary of {algo_name} with {len(results)} tasks: \nART {ART:.2f} \nAWT: {AWT:.2f}',
             f'\nCS: {CS} \nNOQTC: {NOQTC}')
 
-    if print_by_task:
+    if print_by_task and not isinstance(results, MetricsSink):  # The sink doesn't keep the tasks
         for done_task in results:
             print('Task: ', done_task.get_id(), 
                 f'\n-RT: {done_task.response_time},',
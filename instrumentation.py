@@ -0,0 +1,101 @@
+import json
+from time import perf_counter, process_time
+from contextlib import contextmanager, nullcontext
+
+# The Instrumentation the schedulers report to, None when it is off. The schedulers read it once per run
+# and only report once per round, so it costs next to nothing when it is off.
+ACTIVE = None
+
+class Hook:
+    """
+    The interface of the hooks that can be added to an Instrumentation, e.g. to start and stop an external profiler
+    around a phase. Every method is a no-op here, so a hook only overrides what it needs.
+    """
+    def on_phase_start(self, name: str) -> None:
+        pass
+
+    def on_phase_end(self, name: str, wall_time: float, cpu_time: float) -> None:
+        pass
+
+    def on_round(self, algo_name: str, TIME: float, QT: float, queue_length: int) -> None:
+        pass
+
+class Instrumentation:
+    """
+    Collects the wall and CPU time of every phase of a simulation, and the counters the schedulers report once per round:
+    rounds, CPU allocations, rotations (tasks served but not finished), sorts and sorted elements, QT calculations,
+    and the high-water mark of the queue length. Counters are kept per algorithm, e.g. 'IDRR.allocations'.
+    """
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.phases = dict()  # Name: {'calls', 'wall_time', 'cpu_time'}
+        self.counters = dict()
+        self.high_water = dict()
+
+    def add_hook(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times the code in the 'with' block as the phase 'name', phases with the same name add up.
+        """
+        for hook in self.hooks:
+            hook.on_phase_start(name)
+        wall_start = perf_counter(); cpu_start = process_time()
+        try:
+            yield
+        finally:
+            wall_time = perf_counter() - wall_start; cpu_time = process_time() - cpu_start
+            phase = self.phases.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0})
+            phase['calls'] += 1; phase['wall_time'] += wall_time; phase['cpu_time'] += cpu_time
+            for hook in self.hooks:
+                hook.on_phase_end(name, wall_time, cpu_time)
+
+    def count(self, name: str, n=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_high_water(self, name: str, value) -> None:
+        if value > self.high_water.get(name, value - 1):
+            self.high_water[name] = value
+
+    def record_round(self, algo_name: str, allocations: int, rotations: int, sorted_elements: int, queue_length: int, TIME=0, QT=0,
+            lanes=1) -> None:
+        """
+        Called by the schedulers once per round. 'sorted_elements' is the number of tasks sorted (or merged) to start it,
+        0 if there was no sort. A batched round covers one round of every active lane, each with its own QT.
+        """
+        self.count(f'{algo_name}.rounds'); self.count(f'{algo_name}.QT_calculations', lanes)
+        self.count(f'{algo_name}.allocations', allocations); self.count(f'{algo_name}.rotations', rotations)
+        if sorted_elements > 0:
+            self.count(f'{algo_name}.sorts'); self.count(f'{algo_name}.elements_sorted', sorted_elements)
+        self.record_high_water(f'{algo_name}.queue_length', queue_length)
+        for hook in self.hooks:
+            hook.on_round(algo_name, TIME, QT, queue_length)
+
+    def report(self) -> dict:
+        return {'phases': self.phases, 'counters': self.counters, 'high_water': self.high_water,
+            'total': {'wall_time': sum(phase['wall_time'] for phase in self.phases.values()),
+                'cpu_time': sum(phase['cpu_time'] for phase in self.phases.values())}}
+
+    def write_report(self, path: str) -> None:
+        with open(path, 'w') as fid:
+            json.dump(self.report(), fid, indent=2)
+
+@contextmanager
+def activate(instrumentation: Instrumentation):
+    """
+    Makes the schedulers started in the 'with' block (in this process) report to the instrumentation.
+    """
+    global ACTIVE
+    previous = ACTIVE; ACTIVE = instrumentation
+    try:
+        yield instrumentation
+    finally:
+        ACTIVE = previous
+
+def phase(instrumentation, name: str):
+    """
+    instrumentation.phase(name), or a context doing nothing if the instrumentation is None (off).
+    """
+    return nullcontext() if instrumentation is None else instrumentation.phase(name)
@@ -10,12 +10,26 @@ interval = 10 # Which interval should be used to calculate the results? Recommen
 # Should be noted here that the IDRR algorithm can generate a quantum time = 0, then the code throws an ValueError and terminates.
 arrival_time_bounds = [0, 30]; burst_time_bounds = [1, 50] # In which interval should the arrival times and burst times be generated? 
 uniform=True; normal=False # How should the burst times be distributed?
+seed=None # Which seed should the tasks be generated from? None draws a new one (printed) every run
 
 # Output forms 
 IDRR_to_txt=True; NIRR_to_txt=True; # Want the results to be written to .txt files?
 plot_ART=True; plot_AWT=True; plot_CS=True; plot_NOQTC=True # Plot the results 
+background_plots=False # Render the plots in the background while the program finishes?
+
+# Execution
+target_width=None; difference=False; max_simulations=100; confidence=0.95 # Add seeds until the confidence interval of the ART (or {metric: width}) is narrower than target_width? N_simulations is then the least
+adaptive=False; tolerance=0.01; max_evaluations=None # Choose the numbers of tasks adaptively (False or the metric, e.g. 'ART'), refining where the curves bend?
+incremental=False # Apply every algorithm once per simulation and checkpoint it at every interval, instead of reapplying it?
+engine='round' # Compute the algorithms a CPU allocation ('loop'), a whole round ('round') at a time, or all simulations at once ('batched')? Same results
+streaming=False # Collect the metrics as the tasks finish instead of keeping every done task? Same results, constant memory
+resume=False # Continue the last run from the 'results_store' folder, only computing the missing results?
+instrument=False # Write the time of every phase and the counters of the algorithms to 'numerical_results/instrumentation.json'?
+cache=False # Cache the results of every run in 'result_cache.sqlite', so reruns on the same tasks (bounds and seed) are not computed again?
+workers=1 # How many processes should the simulations be spread over? Recommended [1 -> number of cores]
 # ------------- CHANGE INPUT HERE -------------
 
 if __name__ == "__main__":
     simulate(N_simulations, N_tasks, interval, arrival_time_bounds, burst_time_bounds, uniform, normal,
-        IDRR_to_txt, NIRR_to_txt, plot_ART, plot_AWT, plot_CS, plot_NOQTC)
+        IDRR_to_txt, NIRR_to_txt, plot_ART, plot_AWT, plot_CS, plot_NOQTC, incremental, workers, seed, engine, streaming, resume, instrument,
+        background_plots, cache, adaptive, tolerance, max_evaluations, target_width, difference, max_simulations, confidence)
@@ -0,0 +1,178 @@
+from bisect import bisect_right, insort
+from copy import deepcopy
+from math import lgamma, log, pi
+import numpy as np
+
+class P2Quantile:
+    """
+    Estimates a quantile of a stream of values with the P² algorithm (Jain & Chlamtac, 1985), using five markers
+    whatever the number of values. The estimate is exact for the five first values.
+    """
+    def __init__(self, p: float):
+        self.p = p
+        self.heights = list()  # The marker heights, the five first values until there are five
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2*p, 1 + 4*p, 3 + 2*p, 5]
+        self.increments = [0, p/2, p, (1 + p)/2, 1]
+
+    def add(self, value: float) -> None:
+        heights = self.heights; positions = self.positions
+        if len(heights) < 5:
+            insort(heights, value)
+            return
+
+        # Find the cell of the value and move the markers above it
+        k = bisect_right(heights, value)
+        if k == 0:
+            heights[0] = value; k = 1
+        elif k == 5:
+            heights[4] = value; k = 4
+        for i in range(k, 5):
+            positions[i] += 1
+        desired_positions = self.desired_positions; increments = self.increments
+        desired_positions[1] += increments[1]; desired_positions[2] += increments[2]
+        desired_positions[3] += increments[3]; desired_positions[4] += 1
+
+        # Adjust the middle markers that are off their desired position
+        for i in (1, 2, 3):
+            d = desired_positions[i] - positions[i]
+            if (d >= 1 and positions[i+1] - positions[i] > 1) or (d <= -1 and positions[i-1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i-1] < height < heights[i+1]:
+                    height = heights[i] + d*(heights[i+d] - heights[i])/(positions[i+d] - positions[i])
+                heights[i] = height; positions[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q = self.heights; n = self.positions
+        return q[i] + d/(n[i+1] - n[i-1])*((n[i] - n[i-1] + d)*(q[i+1] - q[i])/(n[i+1] - n[i])
+            + (n[i+1] - n[i] - d)*(q[i] - q[i-1])/(n[i] - n[i-1]))
+
+    def value(self) -> float:
+        if len(self.heights) == 0:
+            return float('nan')
+        if len(self.heights) < 5:
+            return self.heights[round(self.p*(len(self.heights) - 1))]
+        return self.heights[2]
+
+class RunningStats:
+    """
+    The count, sum, mean, variance (Welford), min and max of a stream of values, plus estimates of the given quantiles.
+    The mean is the exact sum divided by the count, the same as averaging a list of all the values.
+    """
+    def __init__(self, quantiles=()):
+        self.count = 0; self.total = 0.0
+        self._mean = 0.0; self._M2 = 0.0  # Welford's running mean and sum of squared deviations
+        self.min = float('inf'); self.max = float('-inf')
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, value: float) -> None:
+        self.count += 1; self.total += value
+        delta = value - self._mean
+        self._mean += delta/self.count; self._M2 += delta*(value - self._mean)
+        if value < self.min: self.min = value
+        if value > self.max: self.max = value
+        for quantile in self.quantiles.values():
+            quantile.add(value)
+
+    def add_many(self, values: np.ndarray) -> None:
+        """
+        Adds all the values at once, the mean and variance are merged with Chan's formula.
+        """
+        if len(values) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values); mean = float(np.mean(values)); M2 = float(np.sum((values - mean)**2))
+        delta = mean - self._mean; total_count = self.count + count
+        self._M2 += M2 + delta**2*self.count*count/total_count
+        self._mean += delta*count/total_count
+        self.count = total_count; self.total += float(np.sum(values))
+        self.min = min(self.min, float(np.min(values))); self.max = max(self.max, float(np.max(values)))
+        for quantile in self.quantiles.values():
+            for value in values.tolist():
+                quantile.add(value)
+
+    @property
+    def mean(self) -> float:
+        return self.total/self.count
+
+    @property
+    def variance(self) -> float:
+        return self._M2/self.count
+
+    def summary(self) -> dict:
+        summary = {'count': self.count, 'mean': self.mean, 'std': self.variance**0.5, 'min': self.min, 'max': self.max}
+        summary.update({f'p{round(100*p)}': quantile.value() for p, quantile in self.quantiles.items()})
+        return summary
+
+class MetricsSink:
+    """
+    Collects the metrics of a run as the tasks finish, in constant memory however many tasks there are.
+    Given to IDRR/NIRR the schedulers update it for every finished task, and with keep_tasks=False they don't keep
+    the done tasks at all and return the sink in place of them. calculate_results() takes it like a TaskTable.
+    """
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, keep_tasks=False, quantiles=QUANTILES):
+        self.keep_tasks = keep_tasks
+        self.response_time = RunningStats(quantiles)
+        self.waiting_time = RunningStats(quantiles)
+        self.turnaround_time = RunningStats()
+
+    def __len__(self) -> int:
+        return self.response_time.count
+
+    def add(self, arrival_time: float, burst_time: float, response_time: float, finish_time: float) -> None:
+        """
+        Adds one finished task.
+        """
+        turnaround_time = finish_time - arrival_time
+        self.response_time.add(response_time)
+        self.waiting_time.add(turnaround_time - burst_time)
+        self.turnaround_time.add(turnaround_time)
+
+    def add_many(self, arrival_time: np.ndarray, burst_time: np.ndarray, response_time: np.ndarray, finish_time: np.ndarray) -> None:
+        """
+        Adds the finished tasks given as arrays, in the order they finished.
+        """
+        turnaround_time = finish_time - arrival_time
+        self.response_time.add_many(response_time)
+        self.waiting_time.add_many(turnaround_time - burst_time)
+        self.turnaround_time.add_many(turnaround_time)
+
+    def copy(self) -> 'MetricsSink':
+        return deepcopy(self)
+
+    def summary(self) -> dict:
+        return {'response_time': self.response_time.summary(), 'waiting_time': self.waiting_time.summary(),
+            'turnaround_time': self.turnaround_time.summary()}
+
+def t_quantile(p: float, df: int) -> float:
+    """
+    Returns the p quantile (p >= 0.5) of Student's t distribution with df degrees of freedom, by bisection on its CDF,
+    which is integrated with Simpson's rule, so SciPy is not needed.
+    """
+    log_norm = lgamma((df + 1)/2) - lgamma(df/2) - 0.5*log(df*pi)
+    def cdf(x: float) -> float:
+        t = np.linspace(0, x, 4097)
+        density = np.exp(log_norm - (df + 1)/2*np.log1p(t**2/df))
+        return 0.5 + (x/4096/3)*(density[0] + density[-1] + 4*np.sum(density[1:-1:2]) + 2*np.sum(density[2:-1:2]))
+
+    high = 1.0
+    while cdf(high) < p:
+        high *= 2
+    low = 0.0
+    while high - low > 1e-9*high:
+        middle = (low + high)/2
+        [low, high] = [middle, high] if cdf(middle) < p else [low, middle]
+    return (low + high)/2
+
+def confidence_interval_width(values: np.ndarray, confidence=0.95) -> np.ndarray:
+    """
+    Returns the width of the confidence interval of the mean of the samples along the first axis of 'values',
+    from Student's t distribution. Infinite with less than two samples.
+    """
+    values = np.asarray(values, dtype=np.float64); n = len(values)
+    if n < 2:
+        return np.full(values.shape[1:], np.inf)
+    return 2*t_quantile((1 + confidence)/2, n - 1)*np.std(values, axis=0, ddof=1)/np.sqrt(n)
@@ -0,0 +1,94 @@
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from helper_scripts import calculate_results, pack_dataset, unpack_tasks
+from metrics import MetricsSink
+from algo_1 import IDRR, IDRR_prefixes
+from algo_2 import NIRR, NIRR_prefixes
+from round_engine import IDRR_rounds, IDRR_rounds_prefixes, NIRR_rounds, NIRR_rounds_prefixes
+
+# The implementations of every algorithm, one per engine: 'loop' serves one CPU allocation at a time, 'round' a whole round
+ALGORITHMS = {
+    'IDRR': {'loop': (IDRR, IDRR_prefixes), 'round': (IDRR_rounds, IDRR_rounds_prefixes)},
+    'NIRR': {'loop': (NIRR, NIRR_prefixes), 'round': (NIRR_rounds, NIRR_rounds_prefixes)}}
+
+def evaluate(algo_name: str, tasks, prefix_lengths: list, incremental=False, engine='loop', streaming=False, cache=None) -> list:
+    """
+    Applies one of the algorithms on the x first arrived tasks of a single simulation (a TaskTable) for every x in prefix_lengths,
+    and returns the [ART, AWT, CS, NOQTC] of every prefix in the same order. With incremental=True the algorithm 
+    is run once up to the largest prefix and checkpointed at every prefix, and every checkpoint is finished on its own,
+    otherwise it is reapplied on every prefix. 
+    The engine ('loop' or 'round') decides which implementation is used, they give exactly the same results.
+    With streaming=True the metrics are collected in a MetricsSink as the tasks finish, instead of keeping the done tasks.
+    With a result_cache.ResultCache as 'cache' only the prefixes not in it are computed, and they are added to it.
+    """
+    keys = cache.keys(algo_name, tasks, prefix_lengths) if cache is not None else prefix_lengths
+    RESULTS = cache.get(keys) if cache is not None else dict()
+    todo = [(x, key) for x, key in zip(prefix_lengths, keys) if key not in RESULTS]
+
+    algo, algo_prefixes = ALGORITHMS[algo_name][engine]
+    if not todo:
+        runs = []
+    elif incremental:
+        runs = algo_prefixes(tasks, [x for x, _ in todo], MetricsSink() if streaming else None)
+    else:
+        runs = (algo(tasks[:x], MetricsSink() if streaming else None) for x, _ in todo)
+
+    NEW_RESULTS = dict()
+    for (_, key), [results, cs, noqtc] in zip(todo, runs):
+        [art, awt, att] = calculate_results(algo_name, results, cs, noqtc, print_by_task=False)
+        NEW_RESULTS[key] = [art, awt, att, cs, noqtc]
+    if cache is not None and NEW_RESULTS:
+        cache.put(algo_name, NEW_RESULTS)
+    RESULTS.update(NEW_RESULTS)
+    return [[art, awt, cs, noqtc] for [art, awt, _, cs, noqtc] in (RESULTS[key] for key in keys)]
+
+def evaluate_parallel(task_dataset: list, prefix_lengths: list, incremental=False, workers=2, engine='loop', streaming=False,
+        todo=None, callback=None, cache=None, executor=None) -> dict:
+    """
+    Applies both algorithms on every simulation in the dataset by sending the independent jobs to a pool of 
+    'workers' processes. The dataset is a list of TaskTables, one per simulation. A job is one (simulation, prefix, algorithm), or one (simulation, algorithm) covering all 
+    prefixes if incremental=True. The dataset is sent once to every process as a packed int array. 
+    Only the prefix lengths in todo[(algo_name, n)] are computed if todo is given (like ResultsStore.todo() returns it),
+    and callback(algo_name, n, prefix_lengths, results) is called as soon as each job is done.
+    A ResultCache given as 'cache' is opened in every process and used like in evaluate().
+    A ProcessPoolExecutor given as 'executor' is used (and left open) instead of a new pool, the tasks are then sent with every job.
+
+    Returns a dictionary with the [ART, AWT, CS, NOQTC] lists per algorithm, ordered as
+    OUTPUT['IDRR'][n][i] for simulation n and prefix i, the same as when everything is run in one process. 
+    """
+    if todo is None:
+        todo = {(algo_name, n): prefix_lengths for n in range(len(task_dataset)) for algo_name in ALGORITHMS}
+    packed_dataset = pack_dataset(task_dataset)
+    jobs = list()
+    for (algo_name, n), prefix_lengths_n in todo.items():
+        chunks = [prefix_lengths_n] if incremental else [[x] for x in prefix_lengths_n]
+        packed_tasks = None if executor is None else packed_dataset[n]
+        jobs.extend((algo_name, n, chunk, incremental, engine, streaming, cache, packed_tasks) for chunk in chunks)
+
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(packed_dataset,)) if executor is None else nullcontext(executor)
+    with pool as executor:
+        job_results = executor.map(_run_job, jobs, chunksize=max(1, len(jobs)//(4*workers)))
+
+        OUTPUT = {algo_name: [list() for _ in task_dataset] for algo_name in ALGORITHMS}
+        for (algo_name, n, chunk, *_), results in zip(jobs, job_results):
+            OUTPUT[algo_name][n].extend(results)
+            if callback is not None:
+                callback(algo_name, n, chunk, results)
+    return OUTPUT
+
+# The packed dataset and the simulations already unpacked in this worker process
+_worker_dataset = None
+_worker_tasks = dict()
+
+def _init_worker(packed_dataset) -> None:
+    global _worker_dataset
+    _worker_dataset = packed_dataset
+    _worker_tasks.clear()
+
+def _run_job(job: tuple) -> list:
+    algo_name, n, prefix_lengths, incremental, engine, streaming, cache, packed_tasks = job
+    if packed_tasks is not None:  # Sent with the job to a shared pool
+        return evaluate(algo_name, unpack_tasks(packed_tasks), prefix_lengths, incremental, engine, streaming, cache)
+    if n not in _worker_tasks:
+        _worker_tasks[n] = unpack_tasks(_worker_dataset[n])
+    return evaluate(algo_name, _worker_tasks[n], prefix_lengths, incremental, engine, streaming, cache)
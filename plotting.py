@@ -0,0 +1,63 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from results_store import ResultsStore
+
+# The futures of the plots rendered in the background, not waited for yet
+_background_plots = list()
+
+def render_plot(metric: str, number_of_tasks: list, IDRR_results: np.ndarray, NIRR_results: np.ndarray, plots_path: str, title: str) -> str:
+    """
+    Plots one metric (ART/AWT/CS/NOQTC) of both algorithms for every simulation, given as (N_simulations, prefixes) arrays
+    of the results at number_of_tasks, and saves it to '<metric>.png' in plots_path. matplotlib is only imported here,
+    with the headless Agg backend. Returns the path of the plot.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.rcParams.update({'font.size': 16}) # Change fontsize on the plots
+
+    for n in range(0, len(IDRR_results)):
+        if n == 0:
+            plt.plot(number_of_tasks, IDRR_results[n], 'b--', label=f'IDRR - {metric}', linewidth=2)
+            plt.plot(number_of_tasks, NIRR_results[n], 'k--', label=f'NIRR - {metric}', linewidth=2)
+        else:
+            plt.plot(number_of_tasks, IDRR_results[n], 'b--', linewidth=2)
+            plt.plot(number_of_tasks, NIRR_results[n], 'k--', linewidth=2)
+    if metric == 'NOQTC':
+        plt.ylim([0, max(IDRR_results.max(), 0)+3])
+        plt.legend(loc = 'upper left')
+    else:
+        plt.legend()
+    plt.title(title)
+    plt.xlabel('Number of tasks')
+    plt.ylabel(metric)
+    path = os.path.join(plots_path, f'{metric}.png')
+    plt.savefig(path, bbox_inches='tight')
+    plt.close()
+    return path
+
+def render_plots(metrics: list, store_path: str, plots_path: str, title: str, workers=1, background=False) -> list:
+    """
+    Renders the plots of the given metrics from a snapshot of the results store, loaded before anything is rendered,
+    so a later run rewriting the store never changes plots still being rendered. The plots still rendered in the background
+    by an earlier call are waited for first, so they never overwrite the new ones. With workers = 1 they are rendered one after another
+    in this process, otherwise in parallel in a pool of processes. With background=True the pool is left running and the
+    futures of the plot paths are returned right away (the program still waits for them before it exits),
+    otherwise the paths are returned once all plots are saved.
+    """
+    wait(_background_plots); _background_plots.clear()
+    store = ResultsStore.open(store_path)
+    results = store.load()
+    plots = [(metric, store.prefix_lengths, results['IDRR'][metric], results['NIRR'][metric], plots_path, title) for metric in metrics]
+    if workers <= 1 and not background:
+        return [render_plot(*plot) for plot in plots]
+
+    executor = ProcessPoolExecutor(max(1, min(workers, len(metrics))))
+    futures = [executor.submit(render_plot, *plot) for plot in plots]
+    executor.shutdown(wait=not background)
+    if background:
+        _background_plots.extend(futures)
+        return futures
+    wait(futures)
+    return [future.result() for future in futures]
@@ -0,0 +1,123 @@
+import heapq
+from collections import deque
+
+class ReadyQueue:
+    """
+    This is the ready queue of the schedulers, holding TaskTable rows in the order they are served.
+    The head is served next, and moving it to the tail (a rotation) or removing it is O(1).
+    Tasks can either be appended to the tail as they are, or admitted in O(log n) to a heap where they wait
+    until the next round starts and are merged in after remaining burst time (shortest served first).
+    The largest remaining burst time, the smallest arrival times and the sum of the remaining burst times are
+    kept up to date on the way, so calculating a QT never needs the whole queue to be sorted.
+    """
+    def __init__(self, remaining_burst_time: list, arrival_time=None):
+        self.remaining_burst_time = remaining_burst_time
+        self.arrival_time = arrival_time  # Only needed (and tracked) for smallest_arrival_times()
+        self.served = deque()
+        self.admitted = list()  # Heap of (remaining burst time, -task), the later task first on ties
+        self.arrivals = list()  # Heap of (arrival time, task), tasks no longer queued are removed lazily
+        self.queued = set()
+        self.total_remaining_burst_time = 0  # At the time the tasks were put in the queue
+
+    def copy(self, remaining_burst_time: list, arrival_time=None) -> 'ReadyQueue':
+        """
+        Returns a copy of the queue, reading the remaining burst and arrival times from the given lists.
+        """
+        ready = ReadyQueue(remaining_burst_time, arrival_time)
+        ready.served = self.served.copy(); ready.admitted = self.admitted[:]; ready.arrivals = self.arrivals[:]
+        ready.queued = self.queued.copy(); ready.total_remaining_burst_time = self.total_remaining_burst_time
+        return ready
+
+    def __len__(self) -> int:
+        return len(self.served) + len(self.admitted)
+
+    def append(self, task: int) -> None:
+        """
+        Puts the task at the tail of the queue.
+        """
+        self.served.append(task)
+        self._add(task)
+
+    def admit(self, task: int) -> None:
+        """
+        Puts the task in the queue from the start of the next round, ordered after its remaining burst time.
+        """
+        heapq.heappush(self.admitted, (self.remaining_burst_time[task], -task))
+        self._add(task)
+
+    def _add(self, task: int) -> None:
+        self.total_remaining_burst_time += self.remaining_burst_time[task]
+        if self.arrival_time is not None:
+            heapq.heappush(self.arrivals, (self.arrival_time[task], task))
+            self.queued.add(task)
+
+    def start_round(self) -> None:
+        """
+        Merges the admitted tasks into the served ones. If the served tasks are ordered after remaining burst time,
+        which they stay when all of them are served the same QT, the whole queue is ordered after it.
+        """
+        if len(self.admitted) == 0:
+            return
+        admitted = [-heapq.heappop(self.admitted)[1] for _ in range(len(self.admitted))]
+        remaining_burst_time = self.remaining_burst_time
+        self.served = deque(heapq.merge(self.served, admitted, key=lambda task: (remaining_burst_time[task], -task)))
+
+    def head(self) -> int:
+        return self.served[0]
+
+    def rotate(self) -> None:
+        """
+        Moves the head to the tail.
+        """
+        self.served.append(self.served.popleft())
+
+    def pop(self) -> int:
+        """
+        Removes and returns the head.
+        """
+        task = self.served.popleft()
+        self.queued.discard(task)
+        self._compact()
+        return task
+
+    def _compact(self) -> None:
+        # Drop the tasks no longer queued from the arrivals heap, so it stays as small as the queue
+        arrivals = self.arrivals; queued = self.queued
+        if not queued:
+            arrivals.clear()
+        elif len(arrivals) > 2*len(queued) + 64:
+            arrivals[:] = [arrival for arrival in arrivals if arrival[1] in queued]
+            heapq.heapify(arrivals)
+
+    def drain(self) -> list:
+        """
+        Removes and returns all the tasks in the order they would be served.
+        """
+        self.start_round()
+        tasks = list(self.served)
+        self.served = deque(); self.arrivals = list(); self.queued = set()
+        self.total_remaining_burst_time = 0
+        return tasks
+
+    def max_remaining_burst_time(self, k=1) -> float:
+        """
+        Returns the k:th largest remaining burst time, right after start_round().
+        """
+        return self.remaining_burst_time[self.served[-k]]
+
+    def mean_remaining_burst_time(self) -> float:
+        return self.total_remaining_burst_time/len(self)
+
+    def smallest_arrival_times(self) -> tuple:
+        """
+        Returns the two smallest arrival times of the queued tasks.
+        """
+        arrivals = self.arrivals; queued = self.queued
+        while arrivals[0][1] not in queued:
+            heapq.heappop(arrivals)
+        first = heapq.heappop(arrivals)
+        while arrivals[0][1] not in queued:
+            heapq.heappop(arrivals)
+        second = arrivals[0]
+        heapq.heappush(arrivals, first)
+        return first[0], second[0]
@@ -0,0 +1,103 @@
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+
+current_path = os.path.split(os.path.abspath(__file__))[0]
+
+class ResultCache:
+    """
+    A persistent cache of the results of single runs, in a SQLite file. A run is keyed by a hash of the tasks it was
+    applied on (the x first arrived tasks of a TaskTable), the algorithm, the version of the algorithm and x, and its
+    ART, AWT, ATT, CS and NOQTC are stored, so a sweep over tasks already seen returns right away whichever engine is used.
+    The version of an algorithm is a hash of its source file and of every module the engines compute the results with,
+    so editing any engine invalidates the results, and the results of every other version are dropped when the cache is opened. With more than max_entries results the least recently used ones are evicted.
+    Several processes can use the same file.
+    """
+    ALGORITHM_FILES = {'IDRR': 'algo_1.py', 'NIRR': 'algo_2.py'}
+    ENGINE_FILES = ['helper_scripts.py', 'ready_queue.py', 'round_engine.py', 'batched.py', 'metrics.py', 'parallel.py']
+
+    def __init__(self, path: str, max_entries=1000000):
+        self.path = path; self.max_entries = max_entries
+        self.versions = {algo_name: _files_hash([file] + self.ENGINE_FILES) for algo_name, file in self.ALGORITHM_FILES.items()}
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, algorithm TEXT, version TEXT, '
+                'ART REAL, AWT REAL, ATT REAL, CS INTEGER, NOQTC INTEGER, last_used REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+            for algo_name, version in self.versions.items():
+                self.connection.execute('DELETE FROM results WHERE algorithm = ? AND version != ?', (algo_name, version))
+
+    def __reduce__(self):
+        # Sent to another process as its path, and opened once per process
+        return open_cache, (self.path, self.max_entries)
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def keys(self, algo_name: str, table, prefix_lengths: list) -> list:
+        """
+        Returns the key of the algorithm applied on table[:x] for every x in prefix_lengths. The prefixes are hashed
+        one after another, so it takes one pass over the tasks.
+        """
+        rows = np.ascontiguousarray(np.stack([table.id, table.arrival_time, table.burst_time], axis=1), dtype=np.int64)
+        hasher = hashlib.sha256(f'{algo_name}:{self.versions[algo_name]}:'.encode())
+        KEYS = dict(); hashed = 0
+        for x in sorted(set(prefix_lengths)):
+            hasher.update(rows[hashed:x].tobytes()); hashed = min(x, len(rows))
+            key = hasher.copy(); key.update(f':{x}'.encode())
+            KEYS[x] = key.hexdigest()
+        return [KEYS[x] for x in prefix_lengths]
+
+    def get(self, keys: list) -> dict:
+        """
+        Returns {key: [ART, AWT, ATT, CS, NOQTC]} of the keys in the cache, and marks them as used.
+        """
+        RESULTS = dict()
+        with self.connection:
+            for start in range(0, len(keys), 500):  # Below the limit of SQL variables
+                chunk = keys[start:start+500]; marks = ','.join('?'*len(chunk))
+                for key, *results in self.connection.execute(f'SELECT key, ART, AWT, ATT, CS, NOQTC FROM results WHERE key IN ({marks})', chunk):
+                    RESULTS[key] = results
+                self.connection.execute(f'UPDATE results SET last_used = ? WHERE key IN ({marks})', [time.time()] + chunk)
+        return RESULTS
+
+    def put(self, algo_name: str, results: dict) -> None:
+        """
+        Stores {key: [ART, AWT, ATT, CS, NOQTC]} of the algorithm, and evicts the least recently used results above max_entries.
+        """
+        now = time.time(); version = self.versions[algo_name]
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(key, algo_name, version, art, awt, att, int(cs), int(noqtc), now) for key, [art, awt, att, cs, noqtc] in results.items()])
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)', (excess,))
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM results')
+
+    def close(self) -> None:
+        self.connection.close()
+
+# The caches opened in this process, by path
+_open_caches = dict()
+
+def open_cache(path: str, max_entries=1000000) -> ResultCache:
+    """
+    Returns the ResultCache of the file 'path', opened only once per process.
+    """
+    if path not in _open_caches:
+        _open_caches[path] = ResultCache(path, max_entries)
+    cache = _open_caches[path]; cache.max_entries = max_entries
+    return cache
+
+def _files_hash(files: list) -> str:
+    hasher = hashlib.sha256()
+    for file in files:
+        with open(os.path.join(current_path, file), 'rb') as fid:
+            hasher.update(file.encode() + b'\0' + fid.read())
+    return hasher.hexdigest()
@@ -0,0 +1,110 @@
+import os
+import json
+import numpy as np
+
+class ResultsStore:
+    """
+    A columnar binary store of the results of a simulation, with one row per (simulation, prefix, algorithm).
+    Every column is a memory-mapped .npy file in the store folder, next to a config.json describing the run.
+    Results are flushed to disk as soon as they are written, the 'done' column last, so a run that crashes
+    keeps everything computed so far and can be resumed where it stopped.
+    """
+    ALGORITHMS = ['IDRR', 'NIRR']
+    METRICS = ['ART', 'AWT', 'CS', 'NOQTC']
+    COLUMNS = {'simulation': np.int64, 'number_of_tasks': np.int64, 'algorithm': np.int8,
+        'ART': np.float64, 'AWT': np.float64, 'CS': np.float64, 'NOQTC': np.float64, 'done': np.bool_}
+
+    def __init__(self, path: str, config: dict, prefix_lengths: list, resume=False):
+        """
+        Opens the store in the folder 'path'. With resume=True and a store of the same run (the same config) already there,
+        its results are kept, otherwise a new empty store is created.
+        """
+        self.path = path; self.config = config; self.prefix_lengths = list(prefix_lengths)
+        self.N_simulations = config['N_simulations']
+        self.prefix_index = {x: i for i, x in enumerate(self.prefix_lengths)}
+        if resume and ResultsStore.stored_config(path) == config:
+            self.columns = {name: np.lib.format.open_memmap(self._file(name), mode='r+') for name in self.COLUMNS}
+            return
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+        if os.path.exists(self._file('config')):
+            os.remove(self._file('config'))  # The old columns are no longer valid
+        N_rows = self.N_simulations*len(self.prefix_lengths)*len(self.ALGORITHMS)
+        self.columns = {name: np.lib.format.open_memmap(self._file(name), mode='w+', dtype=dtype, shape=(N_rows,))
+            for name, dtype in self.COLUMNS.items()}
+        [simulation, prefix, algorithm] = np.unravel_index(np.arange(N_rows), (self.N_simulations, len(self.prefix_lengths), len(self.ALGORITHMS)))
+        self.columns['simulation'][:] = simulation
+        self.columns['number_of_tasks'][:] = np.array(self.prefix_lengths, dtype=np.int64)[prefix]
+        self.columns['algorithm'][:] = algorithm
+        self.flush()
+        with open(self._file('config'), 'w') as fid:
+            json.dump(config, fid)
+
+    @classmethod
+    def open(cls, path: str) -> 'ResultsStore':
+        """
+        Opens the store in the folder 'path' read-only, e.g. to render its results.
+        """
+        store = cls.__new__(cls)
+        store.path = path; store.config = cls.stored_config(path)
+        store.N_simulations = store.config['N_simulations']
+        store.columns = {name: np.load(store._file(name), mmap_mode='r') for name in cls.COLUMNS}
+        N_prefixes = len(store.columns['number_of_tasks'])//(store.N_simulations*len(cls.ALGORITHMS))
+        store.prefix_lengths = store.columns['number_of_tasks'][:N_prefixes*len(cls.ALGORITHMS):len(cls.ALGORITHMS)].tolist()
+        store.prefix_index = {x: i for i, x in enumerate(store.prefix_lengths)}
+        return store
+
+    @staticmethod
+    def stored_config(path: str):
+        """
+        Returns the config of the store in the folder 'path', or None if there is none.
+        """
+        try:
+            with open(os.path.join(path, 'config.json')) as fid:
+                return json.load(fid)
+        except FileNotFoundError:
+            return None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, 'config.json' if name == 'config' else f'{name}.npy')
+
+    def _rows(self, algo_name: str, n: int, prefix_lengths: list) -> np.ndarray:
+        prefixes = np.array([self.prefix_index[x] for x in prefix_lengths], dtype=np.int64)
+        return (n*len(self.prefix_lengths) + prefixes)*len(self.ALGORITHMS) + self.ALGORITHMS.index(algo_name)
+
+    def todo(self) -> dict:
+        """
+        Returns the prefix lengths still to be computed per (algorithm, simulation), simulation by simulation.
+        """
+        TODO = dict()
+        for n in range(self.N_simulations):
+            for algo_name in self.ALGORITHMS:
+                done = self.columns['done'][self._rows(algo_name, n, self.prefix_lengths)]
+                if not done.all():
+                    TODO[(algo_name, n)] = [x for x, done_x in zip(self.prefix_lengths, done) if not done_x]
+        return TODO
+
+    def write(self, algo_name: str, n: int, prefix_lengths: list, results: list) -> None:
+        """
+        Writes the [ART, AWT, CS, NOQTC] of every prefix of simulation n to disk.
+        """
+        rows = self._rows(algo_name, n, prefix_lengths)
+        results = np.array(results, dtype=np.float64).reshape(len(rows), len(self.METRICS))
+        for j, metric in enumerate(self.METRICS):
+            self.columns[metric][rows] = results[:, j]
+            self.columns[metric].flush()
+        self.columns['done'][rows] = True
+        self.columns['done'].flush()
+
+    def flush(self) -> None:
+        for column in self.columns.values():
+            column.flush()
+
+    def load(self) -> dict:
+        """
+        Returns the results as OUTPUT['IDRR']['ART'][n][i] for simulation n and prefix i, as (N_simulations, prefixes) arrays.
+        """
+        shape = (self.N_simulations, len(self.prefix_lengths), len(self.ALGORITHMS))
+        return {algo_name: {metric: np.array(self.columns[metric]).reshape(shape)[:, :, a] for metric in self.METRICS}
+            for a, algo_name in enumerate(self.ALGORITHMS)}
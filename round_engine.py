@@ -0,0 +1,211 @@
+from copy import copy
+import numpy as np
+from helper_scripts import as_task_table
+import instrumentation
+
+class RoundState:
+    """
+    Everything a round at a time run of IDRR or NIRR carries from one round to the next. The per task attributes
+    are NumPy arrays and the queue is an array of TaskTable rows, so a whole round is computed with a handful of
+    NumPy operations instead of one Python step per CPU allocation.
+    """
+    def __init__(self, table, sink=None):
+        self.table = table
+        self.arrival_time = table.arrival_time
+        self.remaining_burst_time = table.remaining_burst_time.copy()
+        self.response_time = table.response_time.copy()
+        self.allocated = table.allocated.copy()
+        self.next_task = 0; self.last_task = len(table)  # Rows [next_task, last_task) are still to be admitted
+        self.queue = np.empty(0, dtype=np.int64)  # IDRR: the REQUEST_QUEUE in serving order, NIRR: the ARRIVE_QUEUE
+        self.admitted = list()  # Arrays of rows admitted since the last round started
+        self.DONE_LIST = list(); self.FINISH_TIMES = list()  # One array per round
+        self.sink = sink; self.keep_done = sink is None or sink.keep_tasks  # Update a MetricsSink as the tasks finish?
+        self.QT = 0; self.TIME = 0; self.CS = 0; self.number_of_QT_calculations = 0; self.FIRST_QT = True
+        self.sorted_elements = 0; self.stats = instrumentation.ACTIVE  # Reported to once per round if not None
+
+    def fork(self):
+        """
+        Returns a copy of the state with nothing left to admit. The done tasks are shared since they never change again.
+        """
+        state = copy(self)
+        state.last_task = self.next_task
+        state.remaining_burst_time = self.remaining_burst_time.copy()
+        state.response_time = self.response_time.copy()
+        state.allocated = self.allocated.copy()
+        state.admitted = self.admitted[:]
+        state.DONE_LIST = self.DONE_LIST[:]; state.FINISH_TIMES = self.FINISH_TIMES[:]
+        state.sink = self.sink.copy() if self.sink is not None else None
+        return state
+
+def IDRR_rounds(dataset, sink=None):
+    """
+    The IDRR algorithm computed a round at a time. Gives exactly the same results as algo_1.IDRR, the sink is updated once per round.
+    """
+    return _run(RoundState(as_task_table(dataset), sink), _IDRR_new_round, _IDRR_round)
+
+def NIRR_rounds(dataset, sink=None):
+    """
+    The NIRR algorithm computed a round at a time. Gives exactly the same results as algo_2.NIRR, the sink is updated once per round.
+    """
+    return _run(RoundState(as_task_table(dataset), sink), _NIRR_new_round, _NIRR_round)
+
+def IDRR_rounds_prefixes(dataset, prefix_lengths: list, sink=None) -> list:
+    """
+    Same as algo_1.IDRR_prefixes, computed a round at a time.
+    """
+    return _prefixes(dataset, prefix_lengths, _IDRR_new_round, _IDRR_round, sink)
+
+def NIRR_rounds_prefixes(dataset, prefix_lengths: list, sink=None) -> list:
+    """
+    Same as algo_2.NIRR_prefixes, computed a round at a time.
+    """
+    return _prefixes(dataset, prefix_lengths, _NIRR_new_round, _NIRR_round, sink)
+
+def _prefixes(dataset, prefix_lengths: list, new_round, round, sink=None) -> list:
+    forks = sorted(set(prefix_lengths), reverse=True)  # Smallest prefix in the back
+    results = dict()
+    state = RoundState(as_task_table(dataset), sink)
+    if forks:  # No task after the largest prefix is ever admitted
+        state.last_task = min(state.last_task, forks[0])
+    final_results = _run(state, new_round, round, forks, results)
+
+    # The largest prefix (and any longer one) ends the same way as the main run
+    for x in forks:
+        results[x] = final_results
+    return [results[x] for x in prefix_lengths]
+
+def _run(state: RoundState, new_round, round, forks=None, results=None):
+    while True:
+        _admit(state, new_round, round, forks, results)
+        if not new_round(state):
+            # The queue drained before the next arrival, jump the idle gap straight to it (the rows are in arrival order)
+            if state.next_task == state.last_task:
+                break
+            state.TIME = state.arrival_time[state.next_task].item()
+            continue
+        round(state)
+
+    state.CS -= 1  # It never switches from the last task...
+    if not state.keep_done:
+        return state.sink, state.CS, state.number_of_QT_calculations
+    DONE_LIST = np.concatenate(state.DONE_LIST) if state.DONE_LIST else np.empty(0, dtype=np.int64)
+    FINISH_TIMES = np.concatenate(state.FINISH_TIMES) if state.FINISH_TIMES else np.empty(0)
+    DONE_LIST = state.table.finished(DONE_LIST, state.response_time[DONE_LIST], FINISH_TIMES)
+    return DONE_LIST, state.CS, state.number_of_QT_calculations
+
+def _admit(state: RoundState, new_round, round, forks: list, results: dict) -> None:
+    # All the "arrived" tasks are the rows up to the first arrival time after TIME
+    last_arrived = min(int(np.searchsorted(state.arrival_time, state.TIME, side='right')), state.last_task)
+
+    # Checkpoint the prefixes ending right before one of the arrived tasks
+    while forks and forks[-1] < last_arrived:
+        x = forks.pop()
+        if x >= state.next_task:
+            state.admitted.append(np.arange(state.next_task, x)); state.next_task = x
+            results[x] = _run(state.fork(), new_round, round)
+
+    if last_arrived > state.next_task:
+        state.admitted.append(np.arange(state.next_task, last_arrived)); state.next_task = last_arrived
+
+def _take_admitted(state: RoundState) -> np.ndarray:
+    queue = np.concatenate([state.queue] + state.admitted) if state.admitted else state.queue
+    state.admitted = list()
+    return queue
+
+def _serve(state: RoundState, queue: np.ndarray, slices: np.ndarray) -> np.ndarray:
+    """
+    Serves the tasks in 'queue' one after another, each for its time in 'slices' (one context switch each).
+    Updates TIME, CS and the response times, and returns the time every task leaves the CPU.
+    """
+    TIMES = np.cumsum(np.concatenate(([state.TIME], slices)))
+    not_allocated = ~state.allocated[queue]
+    state.response_time[queue[not_allocated]] = TIMES[:-1][not_allocated] - state.arrival_time[queue[not_allocated]]
+    state.allocated[queue] = True
+    state.TIME = TIMES[-1]; state.CS += len(queue)
+    return TIMES[1:]
+
+def _finish(state: RoundState, rows: np.ndarray, FINISH_TIMES: np.ndarray) -> None:
+    if state.keep_done:
+        state.DONE_LIST.append(rows); state.FINISH_TIMES.append(FINISH_TIMES)
+    if state.sink is not None:
+        state.sink.add_many(state.arrival_time[rows], state.table.burst_time[rows], state.response_time[rows], FINISH_TIMES)
+
+def _IDRR_new_round(state: RoundState) -> bool:
+    queue = _take_admitted(state)
+    if len(queue) == 0:
+        return False
+
+    # Serving order: shortest remaining burst time first, the later task first on ties
+    remaining_burst_time = state.remaining_burst_time
+    state.sorted_elements = 0
+    if len(queue) > len(state.queue):
+        queue = queue[np.lexsort((-queue, remaining_burst_time[queue]))]
+        state.sorted_elements = len(queue)
+    state.queue = queue
+
+    # Calculate the quantum time, the rows are in arrival order so the smallest rows arrived first
+    if len(queue) == 1:
+        state.QT = remaining_burst_time[queue[0]].item()
+    elif state.number_of_QT_calculations == 0:  # The first QT
+        state.QT = round(remaining_burst_time[queue[-1]].item() + remaining_burst_time[queue[-2]].item())/2
+    else:
+        [first_task, second_task] = np.partition(queue, 1)[:2]
+        first_arrival_time = state.arrival_time[first_task].item(); second_arrival_time = state.arrival_time[second_task].item()
+        if state.FIRST_QT:
+            state.QT = round(remaining_burst_time[queue[-1]].item() + state.QT)/2 - round(first_arrival_time + second_arrival_time)/2
+            state.FIRST_QT = False
+        else:
+            state.QT = round(remaining_burst_time[queue[-1]].item() + state.QT)/2 - round(first_arrival_time/2)
+    state.number_of_QT_calculations += 1
+
+    # Edge case, but can happen even with a reasonable dataset. A single first task is never checked,
+    # the QT is recalculated right after its allocation anyway
+    if state.QT <= 0 and (state.number_of_QT_calculations > 1 or len(queue) > 1):
+        raise ValueError(f'[IDRR] QT calculated to: {state.QT}')
+    return True
+
+def _IDRR_round(state: RoundState) -> None:
+    queue = state.queue; QT = state.QT
+    remaining_burst_time = state.remaining_burst_time[queue]
+    finished = QT >= remaining_burst_time
+    slices = np.where(finished, remaining_burst_time, QT)
+    FINISH_TIMES = _serve(state, queue, slices)
+
+    state.remaining_burst_time[queue] = remaining_burst_time - slices
+    _finish(state, queue[finished], FINISH_TIMES[finished])
+    state.queue = queue[~finished]  # Still in serving order
+    if state.stats is not None:
+        state.stats.record_round('IDRR', len(queue), len(state.queue), state.sorted_elements, len(queue), state.TIME, QT)
+
+def _NIRR_new_round(state: RoundState) -> bool:
+    state.queue = _take_admitted(state)
+    return len(state.queue) > 0
+
+def _NIRR_round(state: RoundState) -> None:
+    ARRIVE_QUEUE = state.queue
+    remaining_burst_time = state.remaining_burst_time
+
+    # Calculate the quantum time
+    state.number_of_QT_calculations += 1
+    if len(ARRIVE_QUEUE) == 1 & int(state.table.id[ARRIVE_QUEUE[0]]) == 1:
+            QT = int(state.table.burst_time[ARRIVE_QUEUE[0]])
+    else:
+        QT = round(np.sum(remaining_burst_time[ARRIVE_QUEUE]).item()/len(ARRIVE_QUEUE))
+    state.QT = QT
+
+    # Served from the back of the REQUEST_QUEUE sorted after remaining burst time (stable, reversed)
+    REQUEST_QUEUE = ARRIVE_QUEUE[np.argsort(-remaining_burst_time[ARRIVE_QUEUE], kind='stable')][::-1]
+    remaining_burst_time = remaining_burst_time[REQUEST_QUEUE]
+
+    # A task that is not finished by its first slice but has at most QT/2 left stays in the CPU and finishes
+    first_slices = np.minimum(remaining_burst_time, QT)
+    left = remaining_burst_time - first_slices
+    finished = (left == 0) | (left <= QT/2)
+    slices = np.where(finished, remaining_burst_time, first_slices)
+    FINISH_TIMES = _serve(state, REQUEST_QUEUE, slices)
+
+    state.remaining_burst_time[REQUEST_QUEUE] = remaining_burst_time - slices
+    _finish(state, REQUEST_QUEUE[finished], FINISH_TIMES[finished])
+    state.queue = REQUEST_QUEUE[~finished]  # Moved back to the arrive queue in serving order
+    if state.stats is not None:
+        state.stats.record_round('NIRR', len(REQUEST_QUEUE), len(state.queue), len(REQUEST_QUEUE), len(REQUEST_QUEUE), state.TIME, QT)
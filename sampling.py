@@ -0,0 +1,45 @@
+import numpy as np
+from results_store import ResultsStore
+
+def adaptive_prefix_lengths(evaluate, candidates: list, metric='ART', tolerance=0.01, max_evaluations=None, initial_points=9) -> tuple:
+    """
+    Chooses the numbers of tasks (prefix lengths) to evaluate among 'candidates' (sorted) adaptively, instead of all of them.
+    It starts from initial_points evenly spread candidates and bisects every range between two evaluated prefix lengths,
+    as long as the metric at the midpoint is further than 'tolerance' from the straight line between its ends, so the
+    curves are only sampled densely where they bend. The tolerance is a fraction of the range of the metric on the first points,
+    and the error of a midpoint is the largest one of every curve. The ranges with the largest errors are bisected first, and
+    at most max_evaluations prefix lengths are evaluated in total.
+
+    evaluate(prefix_lengths) has to return {(algo_name, n, x): [ART, AWT, CS, NOQTC]} of every curve (algorithm and simulation)
+    at every x in prefix_lengths. Returns the evaluated prefix lengths in order, and all the results.
+    """
+    candidates = sorted(candidates); j = ResultsStore.METRICS.index(metric)
+    max_evaluations = len(candidates) if max_evaluations is None else max(2, max_evaluations)
+    first = np.unique(np.linspace(0, len(candidates)-1, min(initial_points, max_evaluations)).round().astype(np.int64)).tolist()
+    RESULTS = evaluate([candidates[i] for i in first])
+    curves = sorted(set(key[:2] for key in RESULTS))
+
+    def values(i) -> np.ndarray:
+        return np.array([RESULTS[curve + (candidates[i],)][j] for curve in curves], dtype=np.float64)
+    first_values = np.array([values(i) for i in first])
+    scale = max(float(np.max(first_values) - np.min(first_values)), 1e-12)
+
+    # Ranges (i, k) of candidate indices to bisect, with the error of the range they were split from
+    evaluated = set(first)
+    ranges = [(float('inf'), i, k) for i, k in zip(first[:-1], first[1:])]
+    while len(evaluated) < max_evaluations:
+        ranges = sorted((range_ for range_ in ranges if range_[2] - range_[1] > 1), reverse=True)[:max_evaluations - len(evaluated)]
+        if not ranges:
+            break
+        midpoints = [(i + k)//2 for _, i, k in ranges]
+        RESULTS.update(evaluate([candidates[m] for m in midpoints]))
+        evaluated.update(midpoints)
+
+        NEXT_RANGES = list()
+        for (_, i, k), m in zip(ranges, midpoints):
+            weight = (candidates[m] - candidates[i])/(candidates[k] - candidates[i])
+            error = float(np.max(np.abs(values(m) - ((1 - weight)*values(i) + weight*values(k)))))/scale
+            if error > tolerance:
+                NEXT_RANGES += [(error, i, m), (error, m, k)]
+        ranges = NEXT_RANGES
+    return [candidates[i] for i in sorted(evaluated)], RESULTS
@@ -0,0 +1,312 @@
+"""
+IDRR or NIRR as an online scheduling service. Tasks are submitted while it runs, and the policy is advanced round by round
+on a virtual clock, as far as the submitted tasks allow, instead of on a whole dataset at once.
+
+    python service.py serve --algorithm NIRR --port 8765
+    python service.py load --algorithm NIRR --N-tasks 100000
+    python service.py load --port 8765
+
+The service reads one JSON request per line (from an in-process asyncio queue or a local TCP socket) and answers each one
+with one JSON line:
+
+    {"op": "submit", "arrival_time": 12, "burst_time": 30}    -> {"op": "submit", "id": 1}
+    {"op": "tick", "time": 40}                                -> {"op": "tick", "completions": [...], "metrics": {...}}
+    {"op": "metrics"}                                         -> {"op": "metrics", "metrics": {...}}
+
+A tick tells the service that every task arriving at or before 'time' has been submitted (null: no more tasks will come),
+so every round starting by then can be served. Its answer streams the tasks finished on the way, and the live metrics.
+'load' replays generated tasks through the service and measures the submissions/s and the latency of every decision.
+"""
+import sys
+import json
+import asyncio
+import argparse
+from collections import deque
+from time import perf_counter
+import numpy as np
+import algo_1
+import algo_2
+from metrics import MetricsSink
+from trace_source import TraceSource, add_task
+from helper_scripts import generate_task_tables
+
+_STOP = object()  # Put in the request queue to stop SchedulingService.run()
+
+class OnlineSource:
+    """
+    The task source of an online run. The tasks are pushed to it as they are submitted, in arrival order, and the scheduler
+    only sees the ones that arrive by the watermark, the time up to which every task is known to have been submitted.
+    The finished tasks are collected as completions until they are taken.
+    """
+    def __init__(self):
+        self.pending = deque()  # (id, arrival time, burst time) of the submitted tasks not pulled yet
+        self.watermark = float('-inf')
+        self.number_of_tasks = 0
+        self.completions = list()
+
+    def submit(self, id, arrival_time, burst_time) -> None:
+        if arrival_time <= self.watermark:
+            raise ValueError(f'Task {id} arrives at {arrival_time}, by the last tick ({self.watermark})')
+        if self.pending and arrival_time < self.pending[-1][1]:
+            raise ValueError(f'Task {id} arrives at {arrival_time}, before an earlier submitted task ({self.pending[-1][1]})')
+        self.pending.append((id, arrival_time, burst_time)); self.number_of_tasks += 1
+
+    def next_arrival_time(self) -> float:
+        """
+        Returns the arrival time of the next task, or infinity if it is not known yet.
+        """
+        if self.pending and self.pending[0][1] <= self.watermark:
+            return self.pending[0][1]
+        return float('inf')
+
+    def pull(self, state):
+        """
+        Yields the rows of the tasks arrived by state.TIME (which is never past the watermark), after adding them to the state.
+        """
+        pending = self.pending
+        while pending and pending[0][1] <= state.TIME:
+            yield add_task(state, *pending.popleft())
+
+    def finish(self, state, task: int, TIME) -> None:
+        self.completions.append({'id': state.ids[task], 'arrival_time': state.arrival_time[task], 'burst_time': state.burst_time[task],
+            'response_time': state.response_time[task], 'finish_time': TIME})
+        TraceSource.finish(state, task, TIME)
+
+class OnlineScheduler:
+    """
+    Drives IDRR or NIRR incrementally: tasks are submitted one at a time, and tick(TIME) serves every round starting
+    by TIME, with the same QT calculations, rounds and context switches as IDRR_stream()/NIRR_stream() on the same tasks.
+    Once a tick fails (the IDRR QT <= 0) the round is left half started, so the scheduler is failed: every later
+    submission and tick raises a ValueError, and metrics() still reports the state it failed in, with the error.
+    """
+    ALGORITHMS = {'IDRR': (algo_1.IDRRStreamState, algo_1._step, 'REQUEST_QUEUE'), 'NIRR': (algo_2.NIRRStreamState, algo_2._step, 'ARRIVE_QUEUE')}
+
+    def __init__(self, algo_name='NIRR', sink=None):
+        [State, self._step, self._queue] = self.ALGORITHMS[algo_name]
+        self.algo_name = algo_name
+        self.source = OnlineSource()
+        self.state = State(self.source, MetricsSink() if sink is None else sink)
+        self.error = None  # The error the scheduler failed with
+
+    def submit(self, arrival_time, burst_time, id=None) -> int:
+        """
+        Submits a task, the ids are 1, 2, ... in submission order by default. Returns the id.
+        """
+        self._check()
+        id = self.source.number_of_tasks + 1 if id is None else id
+        self.source.submit(id, arrival_time, burst_time)
+        return id
+
+    def tick(self, TIME=None) -> list:
+        """
+        Moves the watermark to TIME (None: no more tasks will be submitted) and serves every round starting by then.
+        A round that starts by TIME is served to its end. Returns the tasks finished on the way.
+        """
+        self._check()
+        source = self.source; state = self.state
+        source.watermark = max(source.watermark, float('inf') if TIME is None else TIME)
+        try:
+            while state.TIME <= source.watermark and self._step(state):
+                pass
+        except ValueError as error:
+            self.error = error
+            raise
+        [completions, source.completions] = [source.completions, list()]
+        return completions
+
+    def _check(self) -> None:
+        if self.error is not None:
+            raise ValueError(f'The scheduler failed ({self.error}), its state can no longer be used')
+
+    def metrics(self) -> dict:
+        state = self.state; sink = state.sink
+        metrics = {'TIME': state.TIME, 'submitted': self.source.number_of_tasks, 'finished': len(sink),
+            'queued': len(getattr(state, self._queue)) + len(self.source.pending), 'CS': max(state.CS - 1, 0),  # Never switching from the last task
+            'NOQTC': state.number_of_QT_calculations, 'QT': state.QT}
+        if len(sink) > 0:
+            metrics.update(ART=sink.response_time.mean, AWT=sink.waiting_time.mean, ATT=sink.turnaround_time.mean)
+        if self.error is not None:
+            metrics.update(error=str(self.error))
+        return metrics
+
+class SchedulingService:
+    """
+    Serves an OnlineScheduler to asyncio clients, one request at a time in the order they come, from the in-process
+    queue (request()) or from local TCP connections (serve()).
+    """
+    def __init__(self, algo_name='NIRR', sink=None):
+        self.scheduler = OnlineScheduler(algo_name, sink)
+        self.requests = asyncio.Queue()
+
+    async def request(self, request: dict) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.requests.put((request, future))
+        return await future
+
+    async def stop(self) -> None:
+        """
+        Stops run() once the requests put before are handled.
+        """
+        await self.requests.put((_STOP, None))
+
+    async def run(self) -> None:
+        """
+        Handles the requests until stop(). A request failing in any other way than handle() answers is passed on to
+        its caller, so one bad request never stops the others.
+        """
+        while True:
+            [request, future] = await self.requests.get()
+            if request is _STOP:
+                break
+            try:
+                reply = self.handle(request)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            if not future.done():  # The caller may have been cancelled
+                future.set_result(reply)
+
+    def handle(self, request: dict) -> dict:
+        if not isinstance(request, dict):
+            return {'error': f'A request must be a JSON object, not {type(request).__name__}'}
+        op = request.get('op')
+        try:
+            if op == 'submit':
+                return {'op': op, 'id': self.scheduler.submit(request['arrival_time'], request['burst_time'], request.get('id'))}
+            if op == 'tick':
+                completions = self.scheduler.tick(request.get('time'))
+                return {'op': op, 'completions': completions, 'metrics': self.scheduler.metrics()}
+            if op == 'metrics':
+                return {'op': op, 'metrics': self.scheduler.metrics()}
+            raise ValueError(f'Unknown op: {op}')
+        except KeyError as error:
+            return {'op': op, 'error': f'Missing field: {error}'}
+        except (TypeError, ValueError) as error:  # Also the IDRR QT <= 0
+            return {'op': op, 'error': str(error)}
+
+    async def serve(self, host='127.0.0.1', port=8765) -> None:
+        """
+        Serves the requests of local TCP connections, one JSON request per line, until cancelled.
+        """
+        server = await asyncio.start_server(self._connection, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run())
+
+    async def _connection(self, reader, writer) -> None:
+        async for line in reader:
+            try:
+                reply = await self.request(json.loads(line))
+            except json.JSONDecodeError as error:
+                reply = {'error': f'Invalid JSON: {error}'}
+            except Exception as error:
+                reply = {'error': f'{type(error).__name__}: {error}'}
+            writer.write((json.dumps(reply) + '\n').encode())
+            await writer.drain()
+        writer.close()
+
+class SocketClient:
+    """
+    A client of a service started with serve(), with the same request() as SchedulingService.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader; self.writer = writer
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765) -> 'SocketClient':
+        return cls(*await asyncio.open_connection(host, port, limit=2**26))
+
+    async def request(self, request: dict) -> dict:
+        self.writer.write((json.dumps(request) + '\n').encode())
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def load_test(client, N_tasks=100000, arrival_time_bounds=(0, 30), burst_time_bounds=(1, 50), tick_every=100, seed=0) -> dict:
+    """
+    Submits N_tasks generated tasks to the service (or SocketClient) in arrival order, with a tick after every 'tick_every' submissions
+    up to right before the next arrival, and a final tick. Returns the submissions/s, the latency percentiles of the submissions
+    and of the ticks (the scheduling decisions), and the final metrics.
+    """
+    table = generate_task_tables(1, N_tasks, arrival_time_bounds, burst_time_bounds, True, False, seed)[0]
+    arrival_times = table.arrival_time.tolist(); burst_times = table.burst_time.tolist()
+    SUBMIT_LATENCIES = list(); TICK_LATENCIES = list(); completions = 0; errors = list()
+
+    async def timed(request: dict, latencies: list) -> dict:
+        start = perf_counter()
+        reply = await client.request(request)
+        latencies.append(perf_counter() - start)
+        if 'error' in reply:
+            errors.append(reply['error'])
+        return reply
+
+    start = perf_counter()
+    for i, [arrival_time, burst_time] in enumerate(zip(arrival_times, burst_times)):
+        await timed({'op': 'submit', 'arrival_time': arrival_time, 'burst_time': burst_time}, SUBMIT_LATENCIES)
+        if (i + 1) % tick_every == 0 and i + 1 < N_tasks:
+            reply = await timed({'op': 'tick', 'time': arrival_times[i + 1] - 0.5}, TICK_LATENCIES)
+            completions += len(reply.get('completions', []))
+    reply = await timed({'op': 'tick', 'time': None}, TICK_LATENCIES)
+    completions += len(reply.get('completions', []))
+    seconds = perf_counter() - start
+
+    percentiles = lambda latencies: {f'p{p}': float(np.percentile(latencies, p)) for p in (50, 95, 99, 99.9)} if latencies else {}
+    return {'N_tasks': N_tasks, 'seconds': seconds, 'submissions_per_s': N_tasks/seconds, 'completions': completions,
+        'submit_latency': percentiles(SUBMIT_LATENCIES), 'decision_latency': percentiles(TICK_LATENCIES),
+        'metrics': reply.get('metrics'), 'errors': errors[:10]}
+
+async def _load(args) -> dict:
+    if args.port is not None:
+        client = await SocketClient.connect(args.host, args.port)
+        try:
+            return await load_test(client, args.N_tasks, args.arrival_time_bounds, args.burst_time_bounds, args.tick_every, args.seed)
+        finally:
+            await client.close()
+    service = SchedulingService(args.algorithm)
+    runner = asyncio.create_task(service.run())
+    try:
+        return await load_test(service, args.N_tasks, args.arrival_time_bounds, args.burst_time_bounds, args.tick_every, args.seed)
+    finally:
+        await service.stop()
+        await runner
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='IDRR or NIRR as an online scheduling service, and a load generator for it.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='Serve the scheduler on a local TCP port.')
+    load = commands.add_parser('load', help='Load test a service, in this process or on a local TCP port.')
+    for command in (serve, load):
+        command.add_argument('--algorithm', choices=list(OnlineScheduler.ALGORITHMS), default='NIRR')
+        command.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    load.add_argument('--port', type=int, default=None, help='The port of a running service, in this process if not given.')
+    load.add_argument('--N-tasks', type=int, default=100000)
+    load.add_argument('--arrival-time-bounds', type=int, nargs=2, default=[0, 30])
+    load.add_argument('--burst-time-bounds', type=int, nargs=2, default=[1, 50])
+    load.add_argument('--tick-every', type=int, default=100, help='Submissions between two ticks.')
+    load.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        print(f'Serving {args.algorithm} on {args.host}:{args.port}')
+        try:
+            asyncio.run(SchedulingService(args.algorithm).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    results = asyncio.run(_load(args))
+    print(f"{results['N_tasks']} tasks in {results['seconds']:.2f} s, {results['submissions_per_s']:.0f} submissions/s,",
+        f"{results['completions']} completions")
+    for name in ('submit_latency', 'decision_latency'):
+        print(f'{name}:', ', '.join(f'{p} {1e6*latency:.1f} us' for p, latency in results[name].items()))
+    print('metrics:', results['metrics'])
+    for error in results['errors']:
+        print('error:', error)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
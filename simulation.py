@@ -2,14 +2,24 @@ import os
 current_file = os.path.abspath(__file__)
 current_path = os.path.split(current_file)[0]
 import numpy as np
-import matplotlib.pyplot as plt
 from time import time
-from helper_scripts import generate_dataset, calculate_results
-from algo_1 import IDRR
-from algo_2 import NIRR
+import json
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from helper_scripts import generate_task_tables
+from metrics import confidence_interval_width
+from parallel import evaluate, evaluate_parallel
+from batched import evaluate_batched
+from results_store import ResultsStore
+from instrumentation import Instrumentation, activate, phase
+from plotting import render_plots
+from result_cache import ResultCache, open_cache
+from sampling import adaptive_prefix_lengths
 
 def simulate(N_simulations: int, N_tasks: int, interval: int, arrival_time_bounds: list, burst_time_bounds: list, uniform=True, normal=False,
-        IDRR_to_txt=True, NIRR_to_txt=True, plot_ART=True, plot_AWT=True, plot_CS=True, plot_NOQTC=True):
+        IDRR_to_txt=True, NIRR_to_txt=True, plot_ART=True, plot_AWT=True, plot_CS=True, plot_NOQTC=True, incremental=False, workers=1, seed=None, engine='loop', streaming=False, resume=False, instrument=False,
+        background_plots=False, cache=False, adaptive=False, tolerance=0.01, max_evaluations=None, target_width=None, difference=False,
+        max_simulations=100, confidence=0.95):
     """
     This function is the main function of the simulation code. It takes the dataset generated earlier and runs both algorithms, 
     calculates the results and writes it to .txt files and/or plots them. 
@@ -41,6 +51,66 @@ def simulate(N_simulations: int, N_tasks: int, interval: int, arrival_time_bound
             located in the 'numerical results' folder for the NIRR algorithm. 
 
         plot_*** (bool): Decides if the relevent metric should be plotted and saved to a '***.png' file located in the 'plots' folder.
+
+        incremental (bool): Decides if the tasks of every simulation should only be admitted once per algorithm, checkpointing the run right before
+            each evaluated number of tasks is reached instead of reapplying it on every prefix. Every checkpoint still serves its own queue
+            until it drains, so the saving is the admissions and rounds before it. Gives exactly the same results.
+
+        workers (int): The number of processes the independent (simulation, prefix, algorithm) runs are spread over. 
+            With workers = 1 everything runs in this process. Gives exactly the same results.
+
+        seed (int): The seed all the tasks are generated from, the same seed always gives the same results. 
+            If None a new seed is drawn and printed.
+
+        engine (str): How the algorithms are computed, 'loop' serves one CPU allocation at a time and 'round' computes
+            a whole round at once with NumPy, which is much faster for many tasks. 'batched' advances all the simulations together in 2-D arrays,
+            forking them at the evaluated numbers of tasks, one pass per algorithm (incremental and workers are then not used). 
+            Gives exactly the same results.
+
+        streaming (bool): Decides if the metrics should be collected as the tasks finish, in constant memory, instead of keeping
+            every done task until the end of a run. Gives exactly the same results.
+
+        resume (bool): Decides if a run that stopped (or finished) should be continued from the 'results_store' folder, where
+            every result is saved as soon as it is computed. Only the missing results are computed, and the seed is taken from the store
+            if None. With resume = False the store is started over.
+
+        instrument (bool or Instrumentation): Decides if the wall and CPU time of every phase, and the counters of the algorithms
+            (allocations, rotations, sorts, QT calculations, queue high-water marks), should be collected and written to
+            'numerical_results/instrumentation.json'. An Instrumentation can be given to add hooks. Only the algorithms run
+            in this process are counted (not with workers > 1).
+
+        background_plots (bool): Decides if the plots should be rendered in the background, from a snapshot of the results store, while the simulation
+            returns (the program still waits for them before it exits). matplotlib is only imported when something is plotted,
+            and with workers > 1 the plots are rendered in parallel.
+
+        cache (bool or ResultCache): Decides if the results of every (tasks, algorithm, number of tasks) run should be cached in
+            'result_cache.sqlite', so runs on tasks already seen (the same bounds and seed) are not computed again. The cache is keyed
+            by a hash of the tasks and of the source files computing the results (the algorithm's file and every engine), so it is
+            invalidated when any of them changes,
+            and the least recently used results are evicted above max_entries. Gives exactly the same results.
+
+        adaptive (bool or str): Decides if the numbers of tasks should be chosen adaptively among the multiples of 'interval', instead of
+            evaluating all of them. It starts from 9 evenly spread ones and bisects the ranges between them where the metric ('ART', 'AWT', 'CS'
+            or 'NOQTC', True is 'ART') of any curve is further than 'tolerance' from a straight line, so the curves are only sampled densely
+            where they bend. The .txt files then get a column with the number of tasks, and the plots use the uneven x-axis.
+
+        tolerance (float): With adaptive sampling, how far from a straight line the metric may be before a range is bisected,
+            as a fraction of the range of the metric. Recommended range - [0.001, 0.05]
+
+        max_evaluations (int): With adaptive sampling, the largest number of numbers of tasks evaluated, None for no limit.
+
+        target_width (float or dict): Turns on the sequential mode, where simulations with new seeds are added one at a time until the
+            'confidence' interval of the mean ART (or of every metric in a dict {metric: width}) is narrower than the target width at every
+            number of tasks, for both algorithms. N_simulations is then the least number of simulations, and max_simulations the most seeds tried.
+            A simulation that ends in the IDRR ValueError (OBS 1) is recorded and replaced by one with the next seed. How many seeds were needed,
+            the final widths and the failed simulations are written to 'numerical_results/sequential.json'. Not resumed.
+
+        difference (bool): In the sequential mode, decides if the confidence interval is the one of the IDRR - NIRR difference
+            (paired by simulation) instead of the ones of each algorithm.
+
+        max_simulations (int): In the sequential mode, the largest number of seeds tried.
+
+        confidence (float): In the sequential mode, the confidence level of the intervals.
     
     Output:
         plots (folder(.png)): A folder with .png plots of all the performance metrics (ART/AWT/CS/NOQTC), 
@@ -48,29 +118,56 @@ def simulate(N_simulations: int, N_tasks: int, interval: int, arrival_time_bound
         
         numerical_results (folder(.txt)): A folder with .txt files of all the performance metrics (ART/AWT/CS/NOQTC).
 
+        results_store (folder(.npy)): A folder with one .npy column per metric, one row per (simulation, number of tasks, algorithm).
+            The .txt files and plots are rendered from it.
+
+        result_cache.sqlite (file): With cache = True, the results of every run on the tasks seen so far.
+
+        sequential.json (file): In the sequential mode, in 'numerical_results', how many seeds were tried and used,
+            the widest confidence intervals and the simulations that failed.
+
     OBS 1!! The IDRR algorithm can compute a QT that is zero, the code will then throw 'ValueError: [IDRR] QT calculated to: 0.0'.
     This is an obvious flaw of the algorithm, and the simulation would be stuck in an infinite loop if allowed to continue. 
     Hence the program terminates and should be re-simulated. This only happened to me if the upper bound of the arrival time is close
     to the upper bound of the burst time. With 'N_simulations  = 5', 'N_tasks = 500', 'arrival_time_bounds = [0, 35]', 
     'burst_time_bounds = [1, 50]' and uniform=True it happens roughly once every 1000 times. 
+    In the sequential mode (target_width) such a simulation is recorded and replaced by one with the next seed instead.
 
     OBS 2!! The complexity of this whole simulation is very large, roughly around O(N_simulations * N_tasks^4). 
     On my machine, a 2020 Macbook Pro M1, with 'N_simulations = 5', 'N_tasks = 500' and 'interval = 10', 
     it takes ~2 seconds to run the whole program. But with 'N_simulations = 10', 'N_tasks = 1000' and 'interval = 10',
     it takes ~80 seonds... To make absolutely sure that the results are corrct the algorithms are reapplied on all the task every interval. 
     So with an interval of 10, first the algorithm run on task 0-10, then on 0-20, then on 0-30, ..., 0-N_tasks. This causes the large complexity,
-    but I argue that all relevant results can be achieved within seconds anyway, so just be careful with the input parameters. 
+    but I argue that all relevant results can be achieved within seconds anyway, so just be careful with the input parameters.
+    The modes incremental = True (admitting the tasks of every simulation once instead of on every prefix), engine = 'round'
+    (a whole round per NumPy step) and engine = 'batched' (all the simulations together) cut this down
+    with exactly the same results.
+
+    OBS 3!! If the queue drains before the next task has arrived the CPU is idle, and the time jumps straight to the next arrival time,
+    so every task is always scheduled and a sparse workload takes time in proportion to its number of tasks, not to the time it spans.
+    The IDRR QT gets smaller the later the tasks arrive though, so with sparse tasks it often ends in the ValueError of OBS 1.
     """
     time_start = time()
     print(f'Starting {N_simulations} simulation(s), with {N_tasks} tasks each, evaluated at every {interval} number of tasks.')
     
     if (uniform and normal) or (not uniform and not normal):
         raise InterruptedError("Choose either uniform or normal!!")
+    if adaptive and target_width is not None:
+        raise InterruptedError("Choose either adaptive sampling or a target width!!")
+    stats = (instrument if isinstance(instrument, Instrumentation) else Instrumentation()) if instrument else None
+    cache = (cache if isinstance(cache, ResultCache) else open_cache(os.path.join(current_path, 'result_cache.sqlite'))) if cache else None
 
-    # Generate the dataset 
-    task_dataset = generate_dataset(N_simulations, N_tasks, arrival_time_bounds, burst_time_bounds, uniform, normal) 
+    # Generate the dataset, with the seed of the stored run if it is resumed
+    results_store_path = os.path.join(current_path, 'results_store')
+    stored_config = ResultsStore.stored_config(results_store_path)
+    if seed is None and resume and stored_config is not None:
+        seed = stored_config['seed']
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print(f'Generating the tasks with seed {seed}.')
+    with phase(stats, 'generate_dataset'):
+        task_dataset = generate_task_tables(N_simulations, N_tasks, arrival_time_bounds, burst_time_bounds, uniform, normal, seed) 
 
-    plt.rcParams.update({'font.size': 16}) # Change fontsize on the plots 
     plots_path = os.path.join(current_path, 'plots')
     if not os.path.exists(plots_path):
         os.makedirs(plots_path)
@@ -79,114 +176,171 @@ def simulate(N_simulations: int, N_tasks: int, interval: int, arrival_time_bound
         os.makedirs(numerical_results_path)
     
     # Apply the algorithms on the dataset 
-    IDRR_ART = list(); IDRR_AWT = list(); IDRR_CS = list(); IDRR_NOQTC = list(); 
-    NIRR_ART = list(); NIRR_AWT = list(); NIRR_CS = list(); NIRR_NOQTC = list(); 
-
     number_of_tasks = np.linspace(interval, N_tasks, int(N_tasks/interval))
-    for n in range(0, N_simulations):
-        idrr_art = list(); idrr_awt = list(); idrr_cs = list(); idrr_noqtc = list(); 
-        nirr_art = list(); nirr_awt = list(); nirr_cs = list(); nirr_noqtc = list(); 
-
-        for x in number_of_tasks:
-            [idrr_results, cs, noqtc] = IDRR(task_dataset[n][N_tasks-int(x):])
-            [art, awt, att] = calculate_results('IDRR', idrr_results, cs, noqtc, print_by_task=False)
-            idrr_art.append(art); idrr_awt.append(awt); idrr_cs.append(cs); idrr_noqtc.append(noqtc) 
+    prefix_lengths = [int(x) for x in number_of_tasks]
+    config = {'N_simulations': N_simulations, 'N_tasks': N_tasks, 'interval': interval, 'arrival_time_bounds': list(arrival_time_bounds),
+        'burst_time_bounds': list(burst_time_bounds), 'uniform': uniform, 'normal': normal, 'seed': seed,
+        'clock': 'event'}  # Stores from before the idle gaps were jumped are not resumed
+    if adaptive:
+        adaptive = 'ART' if adaptive is True else adaptive
+        config.update(adaptive=adaptive, tolerance=tolerance, max_evaluations=max_evaluations)
+    if target_width is not None:
+        config.update(target_width=target_width, difference=difference, max_simulations=max_simulations, confidence=confidence)
+        with phase(stats, 'sequential'), activate(stats):
+            [store, report] = _simulate_sequential(task_dataset, prefix_lengths, config, incremental, workers, engine, streaming, cache, results_store_path)
+        with open(os.path.join(numerical_results_path, 'sequential.json'), 'w') as fid:
+            json.dump(report, fid, indent=2)
+        N_simulations = store.N_simulations
+        print(f"{'Converged' if report['converged'] else 'Stopped'} after {report['seeds_tried']} seed(s), {N_simulations} simulation(s) used and",
+            f"{len(report['failed'])} failed, the widest confidence interval(s): {report['widths']}.")
+    elif adaptive and not (resume and stored_config == config):
+        with phase(stats, 'sampling'), activate(stats):
+            store = _sample(task_dataset, prefix_lengths, config, incremental, workers, engine, streaming, cache, results_store_path)
+        print(f'Adaptive sampling evaluated {len(store.prefix_lengths)} of {len(prefix_lengths)} numbers of tasks.')
+    else:
+        if adaptive:  # Sampled already
+            prefix_lengths = ResultsStore.open(results_store_path).prefix_lengths
+        store = ResultsStore(results_store_path, config, prefix_lengths, resume)
+    prefix_lengths = store.prefix_lengths
+    todo = store.todo()
+    N_runs = len(ResultsStore.ALGORITHMS)*N_simulations
+    if resume and len(todo) < N_runs:
+        print(f'Resuming, {len(todo)} of {N_runs} (algorithm, simulation) runs left.')
 
-            [nirr_results, cs, noqtc] = NIRR(task_dataset[n][N_tasks-int(x):])
-            [art, awt, att] = calculate_results('NIRR', nirr_results, cs, noqtc, print_by_task=False)
-            nirr_art.append(art); nirr_awt.append(awt); nirr_cs.append(cs); nirr_noqtc.append(noqtc) 
+    # Every result is written to the store as soon as it is computed
+    with phase(stats, 'evaluate'), activate(stats):
+        evaluate_todo(task_dataset, todo, incremental, workers, engine, streaming, cache, store.write)
 
-        IDRR_ART.append(idrr_art); IDRR_AWT.append(idrr_awt); IDRR_CS.append(idrr_cs); IDRR_NOQTC.append(idrr_noqtc)
-        NIRR_ART.append(nirr_art); NIRR_AWT.append(nirr_awt); NIRR_CS.append(nirr_cs); NIRR_NOQTC.append(nirr_noqtc)
+    with phase(stats, 'load_results'):
+        results = store.load()
+        IDRR_ART, IDRR_AWT, IDRR_CS, IDRR_NOQTC = [results['IDRR'][metric] for metric in ResultsStore.METRICS]
+        NIRR_ART, NIRR_AWT, NIRR_CS, NIRR_NOQTC = [results['NIRR'][metric] for metric in ResultsStore.METRICS]
 
     # Print the results to .txt files saved in the folder 'numerical_results'
     if IDRR_to_txt:
-        fid = open(os.path.join(numerical_results_path, 'IDRR_results.txt'), 'w')
-        print('SIM. N|ART      |AWT      |CS       |NOQTC    ', file=fid)
-        for n in range(0, N_simulations):
-            for i in range(int(N_tasks/interval)):
-                print('%5d |%8.2f |%8.2f |%8.2f |%8.2f' % (n, IDRR_ART[n][i], IDRR_AWT[n][i], IDRR_CS[n][i], IDRR_NOQTC[n][i]), file=fid)
-        fid.close() 
+        with phase(stats, 'IDRR_to_txt'):
+            fid = open(os.path.join(numerical_results_path, 'IDRR_results.txt'), 'w')
+            print('SIM. N|' + ('TASKS  |' if adaptive else '') + 'ART      |AWT      |CS       |NOQTC    ', file=fid)
+            for n in range(0, N_simulations):
+                for i in range(len(prefix_lengths)):
+                    print('%5d |' % n + ('%6d |' % prefix_lengths[i] if adaptive else '') +
+                        '%8.2f |%8.2f |%8.2f |%8.2f' % (IDRR_ART[n][i], IDRR_AWT[n][i], IDRR_CS[n][i], IDRR_NOQTC[n][i]), file=fid)
+            fid.close() 
     
     if NIRR_to_txt:
-        fid = open(os.path.join(numerical_results_path, 'NIRR_results.txt'), 'w')
-        print('SIM. N|ART      |AWT      |CS       |NOQTC    ', file=fid)
-        for n in range(0, N_simulations):    
-            for i in range(int(N_tasks/interval)):
-                print('%5d |%8.2f |%8.2f |%8.2f |%8.2f' % (n, NIRR_ART[n][i], NIRR_AWT[n][i], NIRR_CS[n][i], NIRR_NOQTC[n][i]), file=fid)
-        fid.close() 
-
-    # Plot the results to .png files saved in the folder 'plots'
+        with phase(stats, 'NIRR_to_txt'):
+            fid = open(os.path.join(numerical_results_path, 'NIRR_results.txt'), 'w')
+            print('SIM. N|' + ('TASKS  |' if adaptive else '') + 'ART      |AWT      |CS       |NOQTC    ', file=fid)
+            for n in range(0, N_simulations):    
+                for i in range(len(prefix_lengths)):
+                    print('%5d |' % n + ('%6d |' % prefix_lengths[i] if adaptive else '') +
+                        '%8.2f |%8.2f |%8.2f |%8.2f' % (NIRR_ART[n][i], NIRR_AWT[n][i], NIRR_CS[n][i], NIRR_NOQTC[n][i]), file=fid)
+            fid.close() 
 
+    # Plot the results to .png files saved in the folder 'plots', rendered from the store
     if uniform:
         main_string = f'Ar_t = Uniform[{arrival_time_bounds[0]}, {arrival_time_bounds[1]}], B_t = Uniform[{burst_time_bounds[0]}, {burst_time_bounds[1]}]'
     elif normal:
         main_string = f'Ar_t = Uniform[{arrival_time_bounds[0]}, {arrival_time_bounds[1]}], B_t = Normal({int(np.mean(burst_time_bounds))}, {int(1/4*(burst_time_bounds[1] - burst_time_bounds[0]))})'
     
-    if plot_ART:
-        for n in range(0, N_simulations):
-            if n == 0:
-                plt.plot(number_of_tasks, IDRR_ART[n], 'b--', label='IDRR - ART', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_ART[n], 'k--', label='NIRR - ART', linewidth=2)
-            else:
-                plt.plot(number_of_tasks, IDRR_ART[n], 'b--', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_ART[n], 'k--', linewidth=2)
-        plt.legend()
-        plt.title(main_string)
-        plt.xlabel('Number of tasks')
-        plt.ylabel('ART')
-        plt.savefig(os.path.join(plots_path, 'ART.png'), bbox_inches='tight')
-        plt.close()
-    
-    if plot_AWT:
-        for n in range(0, N_simulations):
-            if n == 0:
-                plt.plot(number_of_tasks, IDRR_AWT[n], 'b--', label='IDRR - AWT', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_AWT[n], 'k--', label='NIRR - AWT', linewidth=2)
-            else:
-                plt.plot(number_of_tasks, IDRR_AWT[n], 'b--', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_AWT[n], 'k--', linewidth=2)
-        plt.legend()
-        plt.title(main_string)
-        plt.xlabel('Number of tasks')
-        plt.ylabel('AWT')
-        plt.savefig(os.path.join(plots_path, 'AWT.png'), bbox_inches='tight')
-        plt.close()
-
-    if plot_CS:
-        for n in range(0, N_simulations):  
-            if n == 0:
-                plt.plot(number_of_tasks, IDRR_CS[n], 'b--', label='IDRR - CS', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_CS[n], 'k--', label='NIRR - CS', linewidth=2)
-            else:
-                plt.plot(number_of_tasks, IDRR_CS[n], 'b--', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_CS[n], 'k--', linewidth=2)    
-        plt.legend()
-        plt.title(main_string)
-        plt.xlabel('Number of tasks')
-        plt.ylabel('CS')
-        plt.savefig(os.path.join(plots_path, 'CS.png'), bbox_inches='tight')
-        plt.close()
-    
-    if plot_NOQTC:
-        ylim_max = 0
-        for n in range(0, N_simulations):
-            ylim_max = max(ylim_max, max(IDRR_NOQTC[n]))
-            if n == 0:
-                plt.plot(number_of_tasks, IDRR_NOQTC[n], 'b--', label='IDRR - NOQTC', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_NOQTC[n], 'k--', label='NIRR - NOQTC', linewidth=2)
-            else:
-                plt.plot(number_of_tasks, IDRR_NOQTC[n], 'b--', linewidth=2)
-                plt.plot(number_of_tasks, NIRR_NOQTC[n], 'k--', linewidth=2)    
-        plt.ylim([0, ylim_max+3])
-        plt.legend(loc = 'upper left')
-        plt.title(main_string)
-        plt.xlabel('Number of tasks')
-        plt.ylabel('NOQTC')
-        plt.savefig(os.path.join(plots_path, 'NOQTC.png'), bbox_inches='tight')
-        plt.close()
+    plots = [metric for metric, plot in zip(ResultsStore.METRICS, [plot_ART, plot_AWT, plot_CS, plot_NOQTC]) if plot]
+    if plots:
+        with phase(stats, 'plots'):
+            render_plots(plots, results_store_path, plots_path, main_string, min(workers, len(plots)), background_plots)
     
+    if stats is not None:
+        stats.write_report(os.path.join(numerical_results_path, 'instrumentation.json'))
     time_end = time()
     print(f'Simulation finished in {time_end - time_start:.2f} seconds!!')
-    
-    
\ No newline at end of file
+
+def evaluate_todo(task_dataset: list, todo: dict, incremental=False, workers=1, engine='loop', streaming=False, cache=None, callback=None,
+        executor=None) -> None:
+    """
+    Applies the algorithms on the prefix lengths in todo[(algo_name, n)] of every simulation n in the dataset, with the engine
+    and number of workers of simulate(), and calls callback(algo_name, n, prefix_lengths, results) with the [ART, AWT, CS, NOQTC]
+    of the prefixes as soon as they are computed. The batched engine computes every prefix length in todo for every simulation in it.
+    With workers > 1 the jobs are sent to 'executor' if it is given, instead of a new pool of processes.
+    Nothing is done if todo is empty.
+    """
+    if not todo:
+        return
+    prefix_lengths = sorted(set(x for prefix_lengths_n in todo.values() for x in prefix_lengths_n))
+    if engine == 'batched':
+        simulations = sorted(set(n for _, n in todo))
+        results = evaluate_batched([task_dataset[n] for n in simulations], prefix_lengths, cache=cache)
+        for algo_name in ResultsStore.ALGORITHMS:
+            for n, results_n in zip(simulations, results[algo_name]):
+                callback(algo_name, n, prefix_lengths, results_n)
+    elif workers > 1:
+        evaluate_parallel(task_dataset, prefix_lengths, incremental, workers, engine, streaming, todo, callback, cache, executor)
+    else:
+        for (algo_name, n), prefix_lengths_n in todo.items():
+            callback(algo_name, n, prefix_lengths_n, evaluate(algo_name, task_dataset[n], prefix_lengths_n, incremental, engine, streaming, cache))
+
+def _sample(task_dataset: list, candidates: list, config: dict, incremental, workers, engine, streaming, cache, results_store_path: str) -> ResultsStore:
+    # Chooses the prefix lengths adaptively, and writes all the results computed on the way to a new store
+    evaluate_prefixes = lambda prefix_lengths: _evaluate_results(task_dataset, prefix_lengths, incremental, workers, engine, streaming, cache)
+    [prefix_lengths, RESULTS] = adaptive_prefix_lengths(evaluate_prefixes, candidates, config['adaptive'], config['tolerance'], config['max_evaluations'])
+    store = ResultsStore(results_store_path, config, prefix_lengths)
+    for n in range(len(task_dataset)):
+        for algo_name in ResultsStore.ALGORITHMS:
+            store.write(algo_name, n, prefix_lengths, [RESULTS[(algo_name, n, x)] for x in prefix_lengths])
+    return store
+
+def _simulate_sequential(task_dataset: list, prefix_lengths: list, config: dict, incremental, workers, engine, streaming, cache,
+        results_store_path: str) -> tuple:
+    # Simulates one seed after another until the confidence intervals are narrow enough, and writes the results to a new store
+    target_width = config['target_width'] if isinstance(config['target_width'], dict) else {'ART': config['target_width']}
+    RESULTS = list(); SIMULATIONS = list(); FAILED = list(); widths = dict()
+    attempts = 0
+    # One pool of processes for every seed, instead of one per seed
+    pool = ProcessPoolExecutor(workers) if workers > 1 and engine != 'batched' else nullcontext()
+    with pool as executor:
+        while attempts < config['max_simulations']:
+            if attempts < len(task_dataset):
+                table = task_dataset[attempts]
+            else:  # A fresh seed
+                table = generate_task_tables(1, config['N_tasks'], config['arrival_time_bounds'], config['burst_time_bounds'], config['uniform'],
+                    config['normal'], config['seed'], attempts)[0]
+            attempts += 1
+            try:
+                results = _evaluate_results([table], prefix_lengths, incremental, workers, engine, streaming, cache, executor)
+            except ValueError as error:
+                if not str(error).startswith('[IDRR] QT calculated'):
+                    raise
+                # The IDRR QT <= 0, retried with the next seed
+                FAILED.append({'simulation': attempts - 1, 'error': str(error)})
+                continue
+            RESULTS.append(results); SIMULATIONS.append(attempts - 1)
+
+            # The widest confidence interval over the prefixes, of both algorithms or of their difference
+            for metric in target_width:
+                j = ResultsStore.METRICS.index(metric)
+                values = np.array([[[results[(algo_name, 0, x)][j] for x in prefix_lengths] for algo_name in ResultsStore.ALGORITHMS] for results in RESULTS])
+                if config['difference']:
+                    values = values[:, 0] - values[:, 1]
+                widths[metric] = float(np.max(confidence_interval_width(values, config['confidence'])))
+            if len(RESULTS) >= len(task_dataset) and all(widths[metric] < width for metric, width in target_width.items()):
+                break
+    if not RESULTS:
+        raise ValueError(f'All {attempts} simulations ended in a QT <= 0')
+
+    config = dict(config, N_simulations=len(RESULTS))
+    store = ResultsStore(results_store_path, config, prefix_lengths)
+    for n, results in enumerate(RESULTS):
+        for algo_name in ResultsStore.ALGORITHMS:
+            store.write(algo_name, n, prefix_lengths, [results[(algo_name, 0, x)] for x in prefix_lengths])
+    report = {'simulations': len(RESULTS), 'seeds_tried': attempts, 'converged': all(widths[metric] < width for metric, width in target_width.items()),
+        'widths': {metric: width if np.isfinite(width) else None for metric, width in widths.items()},  # None below 2 simulations
+        'target_width': target_width, 'difference': config['difference'], 'confidence': config['confidence'],
+        'simulations_used': SIMULATIONS, 'failed': FAILED}
+    return store, report
+
+def _evaluate_results(task_dataset: list, prefix_lengths: list, incremental, workers, engine, streaming, cache, executor=None) -> dict:
+    # Returns {(algo_name, n, x): [ART, AWT, CS, NOQTC]} of every simulation n and x in prefix_lengths
+    RESULTS = dict()
+    def collect(algo_name, n, prefix_lengths_n, results):
+        RESULTS.update({(algo_name, n, x): results_x for x, results_x in zip(prefix_lengths_n, results)})
+    todo = {(algo_name, n): prefix_lengths for n in range(len(task_dataset)) for algo_name in ResultsStore.ALGORITHMS}
+    evaluate_todo(task_dataset, todo, incremental, workers, engine, streaming, cache, collect, executor)
+    return RESULTS
@@ -0,0 +1,97 @@
+"""
+Checks that every engine gives exactly the same results as the loop engine reapplied on every prefix, on random datasets
+with ties in the arrival times, zero burst times, idle gaps and prefixes of every length.
+
+    python -m pytest -q test_engines.py
+"""
+import numpy as np
+import pytest
+from helper_scripts import TaskTable, generate_task_tables
+from parallel import evaluate
+from batched import BATCHED_ALGORITHMS, evaluate_batched
+from trace_source import TraceSource
+from algo_1 import IDRR_stream
+from algo_2 import NIRR_stream
+from service import OnlineScheduler
+
+ALGORITHMS = {'IDRR': IDRR_stream, 'NIRR': NIRR_stream}
+N_TASKS = 60
+
+def random_table(seed: int) -> TaskTable:
+    # Few distinct arrival times (ties), zero burst times, and every few seeds long gaps between the arrivals
+    rng = np.random.default_rng(seed)
+    arrival_time = np.sort(rng.integers(0, [5, 40, 3000][seed % 3], N_TASKS))
+    burst_time = rng.integers(0 if seed % 2 else 1, 20, N_TASKS)
+    return TaskTable(np.arange(1, N_TASKS+1), arrival_time, burst_time)
+
+TABLES = [random_table(seed) for seed in range(24)]
+TABLES += generate_task_tables(6, N_TASKS, [0, 30], [1, 50], True, False, 0) + generate_task_tables(6, N_TASKS, [0, 0], [1, 50], False, True, 1)
+PREFIX_LENGTHS = [1, 2, 3, 7, 20, 41, N_TASKS - 1, N_TASKS]
+
+def reference(algo_name: str, table: TaskTable, prefix_lengths: list):
+    # The loop engine reapplied on every prefix, None for the prefixes ending in the IDRR QT <= 0 error
+    RESULTS = list()
+    for x in prefix_lengths:
+        try:
+            RESULTS.append(evaluate(algo_name, table, [x])[0])
+        except ValueError:
+            RESULTS.append(None)
+    return RESULTS
+
+def assert_same(results: list, expected: list) -> None:
+    for [art, awt, cs, noqtc], [ART, AWT, CS, NOQTC] in zip(results, expected):
+        assert (cs, noqtc) == (CS, NOQTC)
+        assert art == pytest.approx(ART, rel=1e-12, abs=1e-9) and awt == pytest.approx(AWT, rel=1e-12, abs=1e-9)
+
+@pytest.mark.parametrize('algo_name', ALGORITHMS)
+@pytest.mark.parametrize('table', range(len(TABLES)))
+def test_engines(algo_name, table):
+    table = TABLES[table]
+    expected = reference(algo_name, table, PREFIX_LENGTHS)
+    for incremental, engine, streaming in [(True, 'loop', False), (False, 'round', False), (True, 'round', False), (True, 'loop', True), (False, 'round', True)]:
+        for x, expected_x in zip(PREFIX_LENGTHS, expected):
+            if expected_x is None:
+                with pytest.raises(ValueError):
+                    evaluate(algo_name, table, [x], incremental, engine, streaming)
+            else:
+                assert_same(evaluate(algo_name, table, [x], incremental, engine, streaming), [expected_x])
+        # All the prefixes in one run, skipping the ones ending in the error
+        prefix_lengths = [x for x, expected_x in zip(PREFIX_LENGTHS, expected) if expected_x is not None]
+        assert_same(evaluate(algo_name, table, prefix_lengths, incremental, engine, streaming), [expected_x for expected_x in expected if expected_x is not None])
+
+    for x, expected_x in zip(PREFIX_LENGTHS, expected):
+        if expected_x is None:
+            continue
+        assert_same(_batched(algo_name, table, x), [expected_x])
+        assert_same(_stream(algo_name, table[:x]), [expected_x])
+        for tick_every in [1, 4, x]:
+            assert_same(_online(algo_name, table[:x], tick_every), [expected_x])
+
+def test_batched_lanes():
+    # Every simulation and prefix in one batch
+    tables = TABLES[-6:]
+    RESULTS = evaluate_batched(tables, PREFIX_LENGTHS)
+    for algo_name in ALGORITHMS:
+        for table, results in zip(tables, RESULTS[algo_name]):
+            assert_same(results, reference(algo_name, table, PREFIX_LENGTHS))
+
+def _batched(algo_name: str, table: TaskTable, x: int) -> list:
+    results = BATCHED_ALGORITHMS[algo_name](table.arrival_time[None], table.burst_time[None], table.id[None], [x])
+    return [[results['ART'][0, 0], results['AWT'][0, 0], results['CS'][0, 0], results['NOQTC'][0, 0]]]
+
+def _stream(algo_name: str, table: TaskTable) -> list:
+    [sink, CS, NOQTC] = ALGORITHMS[algo_name](TraceSource.from_table(table, rebase=False))
+    return [[sink.response_time.mean, sink.waiting_time.mean, CS, NOQTC]]
+
+def _online(algo_name: str, table: TaskTable, tick_every: int) -> list:
+    # Submitted in arrival order, ticking up to right before the next arrival after every tick_every submissions
+    scheduler = OnlineScheduler(algo_name); finished = 0
+    arrival_times = table.arrival_time.tolist()
+    for i, [arrival_time, burst_time] in enumerate(zip(arrival_times, table.burst_time.tolist())):
+        scheduler.submit(arrival_time, burst_time)
+        if (i + 1) % tick_every == 0 and i + 1 < len(table) and arrival_times[i + 1] > arrival_time:
+            finished += len(scheduler.tick(arrival_times[i + 1] - 0.5))
+    finished += len(scheduler.tick(None))
+    metrics = scheduler.metrics()
+    assert finished == len(table)
+    return [[metrics['ART'], metrics['AWT'], metrics['CS'], metrics['NOQTC']]]
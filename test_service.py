@@ -0,0 +1,83 @@
+"""
+Checks that bad requests to the scheduling service, in process or over TCP, get an error reply and never stop it
+for the other clients.
+
+    python -m pytest -q test_service.py
+"""
+import json
+import asyncio
+import pytest
+from service import OnlineScheduler, SchedulingService, SocketClient
+
+BAD_REQUESTS = [None, [1, 2], 1, 'x', {'op': 'submit'}, {'op': 'unknown'}]
+# (arrival time, burst time) of tasks on which IDRR calculates a QT <= 0
+QT_ERROR_TASKS = [(20, 11), (24, 11), (25, 18), (29, 6), (38, 16)]
+
+def serve(test) -> None:
+    # Runs test(service) with the service running, and stops it
+    async def main():
+        service = SchedulingService('NIRR')
+        runner = asyncio.create_task(service.run())
+        try:
+            await test(service)
+        finally:
+            await service.stop()
+            await asyncio.wait_for(runner, 5)
+    asyncio.run(main())
+
+def request(service, request: dict):
+    # A request that fails instead of hanging if the service stopped
+    return asyncio.wait_for(service.request(request), 5)
+
+def test_bad_requests():
+    async def test(service):
+        for bad_request in BAD_REQUESTS:
+            assert 'error' in await request(service, bad_request)
+        assert (await request(service, {'op': 'submit', 'arrival_time': 0, 'burst_time': 5}))['id'] == 1
+        assert (await request(service, {'op': 'tick', 'time': None}))['metrics']['finished'] == 1
+    serve(test)
+
+def test_failing_request():
+    # An exception handle() does not answer goes to its caller, the next requests are still served
+    async def test(service):
+        metrics = service.scheduler.metrics
+        service.scheduler.metrics = lambda: 1/0
+        with pytest.raises(ZeroDivisionError):
+            await request(service, {'op': 'metrics'})
+        service.scheduler.metrics = metrics
+        assert (await request(service, {'op': 'metrics'}))['metrics']['submitted'] == 0
+    serve(test)
+
+def test_bad_lines_over_tcp():
+    async def test(service):
+        server = await asyncio.start_server(service._connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            bad = await SocketClient.connect('127.0.0.1', port)
+            for line in [json.dumps(request) for request in BAD_REQUESTS] + ['{']:
+                bad.writer.write((line + '\n').encode())
+                assert 'error' in json.loads(await asyncio.wait_for(bad.reader.readline(), 5))
+            client = await SocketClient.connect('127.0.0.1', port)
+            reply = await asyncio.wait_for(client.request({'op': 'metrics'}), 5)
+            assert reply['metrics']['submitted'] == 0
+            await bad.close(); await client.close()
+    serve(test)
+
+def test_failed_scheduler():
+    # After the IDRR QT <= 0 the scheduler rejects the submissions and ticks, its state is half updated
+    scheduler = OnlineScheduler('IDRR')
+    for arrival_time, burst_time in QT_ERROR_TASKS:
+        scheduler.submit(arrival_time, burst_time)
+    with pytest.raises(ValueError, match='QT calculated'):
+        scheduler.tick(None)
+    with pytest.raises(ValueError, match='failed'):
+        scheduler.tick(None)
+    with pytest.raises(ValueError, match='failed'):
+        scheduler.submit(100, 1)
+    assert 'QT calculated' in scheduler.metrics()['error']
+
+    async def test(service):
+        service.scheduler = scheduler
+        assert 'failed' in (await request(service, {'op': 'tick', 'time': None}))['error']
+        assert 'QT calculated' in (await request(service, {'op': 'metrics'}))['metrics']['error']
+    serve(test)
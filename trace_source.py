@@ -0,0 +1,172 @@
+"""
+Replays a scheduler trace of (arrival time, burst time) records, sorted by arrival time, through IDRR and NIRR
+without ever loading the whole trace, e.g. a production trace with tens of millions of tasks.
+
+    python trace_source.py trace.csv
+    python trace_source.py trace.npy --algorithms NIRR
+
+A .npy trace is an int array of shape (N_tasks, 2) holding the arrival and burst time of every task, or (N_tasks, 3) with
+the id first (the layout of pack_dataset()), and is memory-mapped. A .csv trace has the same columns, or a header naming
+them ('id', 'arrival_time', 'burst_time' in any order), and is memory-mapped and parsed line by line.
+"""
+import os
+import sys
+import mmap
+import argparse
+import numpy as np
+from helper_scripts import calculate_results
+from algo_1 import IDRR_stream
+from algo_2 import NIRR_stream
+
+class TraceSource:
+    """
+    An iterator over the (id, arrival time, burst time) of the tasks of a trace, in arrival order.
+    The schedulers pull the tasks from it as TIME reaches their arrival time (see IDRR_stream() and NIRR_stream()),
+    so only the queued tasks are ever in memory. The arrival times are shifted so that the first task arrives at TIME 0.
+    """
+    def __init__(self, records, rebase=True):
+        self.records = iter(records)
+        self.offset = None if rebase else 0
+        self.number_of_tasks = 0
+        self._next = None; self._advance()
+
+    @classmethod
+    def from_file(cls, path: str, rebase=True, block_size=65536) -> 'TraceSource':
+        """
+        Opens a .npy or .csv trace, see the module docstring for the formats.
+        """
+        if os.path.splitext(path)[1] == '.npy':
+            return cls(_npy_records(path, block_size), rebase)
+        return cls(_csv_records(path), rebase)
+
+    @classmethod
+    def from_table(cls, table, rebase=True) -> 'TraceSource':
+        """
+        Replays the tasks of a TaskTable, e.g. to check a streamed run against the in-memory one.
+        """
+        return cls(zip(table.id.tolist(), table.arrival_time.tolist(), table.burst_time.tolist()), rebase)
+
+    def _advance(self) -> None:
+        record = next(self.records, None)
+        if record is None:
+            self._next = None
+            return
+        [id, arrival_time, burst_time] = record
+        if self.offset is None:
+            self.offset = arrival_time
+        arrival_time -= self.offset
+        if self._next is not None and arrival_time < self._next[1]:
+            raise ValueError(f'The trace is not sorted by arrival time at task {self.number_of_tasks + 1}')
+        self._next = (id, arrival_time, burst_time); self.number_of_tasks += 1
+
+    def next_arrival_time(self) -> float:
+        """
+        Returns the arrival time of the next task, or infinity if the trace is exhausted.
+        """
+        return float('inf') if self._next is None else self._next[1]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple:
+        if self._next is None:
+            raise StopIteration
+        record = self._next
+        self._advance()
+        return record
+
+    def pull(self, state):
+        """
+        Yields the rows of the tasks arrived by state.TIME, numbered on from state.next_task, after adding their
+        attributes to the per task dicts of the scheduler state.
+        """
+        while self._next is not None and self._next[1] <= state.TIME:
+            yield add_task(state, *next(self))
+
+    @staticmethod
+    def finish(state, task: int, TIME) -> None:
+        """
+        Called by the scheduler when a task finishes at TIME, removes it from the per task dicts of the state.
+        """
+        del state.ids[task], state.arrival_time[task], state.burst_time[task]
+        del state.remaining_burst_time[task], state.response_time[task], state.allocated[task]
+
+def add_task(state, id, arrival_time, burst_time) -> int:
+    """
+    Adds a task pulled from a source to the per task dicts of a scheduler state, as its next row, and returns the row.
+    """
+    task = state.next_task; state.next_task += 1
+    state.ids[task] = id; state.arrival_time[task] = arrival_time; state.burst_time[task] = burst_time
+    state.remaining_burst_time[task] = float(burst_time); state.response_time[task] = 0.0; state.allocated[task] = False
+    return task
+
+def _npy_records(path: str, block_size: int):
+    trace = np.load(path, mmap_mode='r')
+    if trace.ndim != 2 or trace.shape[1] not in (2, 3):
+        raise ValueError(f'A .npy trace has to be of shape (N_tasks, 2) or (N_tasks, 3), not {trace.shape}')
+    for start in range(0, len(trace), block_size):
+        block = trace[start:start+block_size].tolist()
+        if trace.shape[1] == 3:
+            yield from block
+        else:
+            for i, [arrival_time, burst_time] in enumerate(block, start+1):
+                yield i, arrival_time, burst_time
+
+def _csv_records(path: str):
+    with open(path, 'rb') as fid:
+        if os.fstat(fid.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as trace:
+            columns = None; i = 0
+            for line in iter(trace.readline, b''):
+                fields = line.strip().split(b',')
+                if fields == [b'']:
+                    continue
+                if columns is None:
+                    try:
+                        [_number(field) for field in fields]
+                    except ValueError:  # A header
+                        names = [field.strip().decode() for field in fields]
+                        columns = [names.index(name) if name in names else None for name in ['id', 'arrival_time', 'burst_time']]
+                        continue
+                    columns = [0, 1, 2] if len(fields) == 3 else [None, 0, 1]
+                i += 1
+                yield (i if columns[0] is None else _number(fields[columns[0]]),
+                    _number(fields[columns[1]]), _number(fields[columns[2]]))
+
+def _number(field: bytes):
+    try:
+        return int(field)
+    except ValueError:
+        return float(field)
+
+def write_trace(path: str, table) -> None:
+    """
+    Writes the tasks of a TaskTable to a .npy or .csv trace.
+    """
+    trace = np.stack([table.id, table.arrival_time, table.burst_time], axis=1)
+    if os.path.splitext(path)[1] == '.npy':
+        np.save(path, trace)
+    else:
+        np.savetxt(path, trace, fmt='%d', delimiter=',', header='id,arrival_time,burst_time', comments='')
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Replays a (arrival time, burst time) trace through the scheduling algorithms.')
+    parser.add_argument('trace', help='A .npy or .csv trace, sorted by arrival time.')
+    parser.add_argument('--algorithms', nargs='+', choices=['IDRR', 'NIRR'], default=['IDRR', 'NIRR'])
+    args = parser.parse_args(argv)
+
+    for algo_name in args.algorithms:
+        algo = IDRR_stream if algo_name == 'IDRR' else NIRR_stream
+        try:
+            [sink, CS, NOQTC] = algo(TraceSource.from_file(args.trace))
+        except ValueError as error:
+            print(f'\n{algo_name} stopped:', error)
+            continue
+        calculate_results(algo_name, sink, CS, NOQTC, print_results=True)
+        for metric, summary in sink.summary().items():
+            print(f'{metric}:', ', '.join(f'{name} {value:.6g}' for name, value in summary.items()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())